@@ -0,0 +1,510 @@
+"""Zuteilungslogik des Wichtel-Zuteilers ohne Streamlit- oder Datenbank-Abhängigkeiten.
+
+Die Funktionen hier sind frei von Seiteneffekten beim Import, damit sie auch in
+Worker-Prozessen (siehe `generate_group_assignments`) genutzt werden können.
+"""
+
+import base64
+import binascii
+import functools
+import hashlib
+import hmac
+import multiprocessing
+import os
+import random
+import secrets
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+CODE_CHARS = 'ABCDEFGHJKMNPQRSTUVWXYZ23456789'
+SEED_BYTES = 32
+_SEAL_PREFIX = "v1."
+# Version des Solvers für Seed-Sessions; wird mit der Session gespeichert. Jede Änderung,
+# die für denselben Seed eine andere Zuteilung ergibt, braucht eine neue Version.
+SEED_ALGORITHM = 2
+
+
+def generate_code(length=6):
+    """Generiert einen zufälligen Code"""
+    chars = 'ABCDEFGHJKMNPQRSTUVWXYZ23456789'
+    return ''.join(random.choice(chars) for _ in range(length))
+
+def generate_user_password(length=8):
+    """Generiert ein lesbares Passwort für User"""
+    words = ['Stern', 'Baum', 'Schnee', 'Mond', 'Licht', 'Engel', 'Kerze', 'Glocke', 
+             'Frost', 'Wind', 'Nebel', 'Sonne', 'Regen', 'Wolke', 'Blitz', 'Feuer']
+    nums = ''.join([str(random.randint(0, 9)) for _ in range(3)])
+    return f"{random.choice(words)}{nums}"
+
+def generate_session_code(length=12):
+    """Generiert einen einmaligen Session-Admin-Code."""
+    chars = 'ABCDEFGHJKMNPQRSTUVWXYZ23456789'
+    return ''.join(random.choice(chars) for _ in range(length))
+
+def parse_constraints(pairs_text, names, warnings=None):
+    """Parst Ausschluss-Gruppen und persönliche Ausschlusslisten aus dem Textfeld.
+
+    `Anna,Ben,Carla` bildet eine Gruppe (z. B. Haushalt), deren Mitglieder sich
+    gegenseitig nicht beschenken. `Anna: Ben, Carla` heißt: Anna beschenkt weder Ben
+    noch Carla (nur in diese Richtung). Steht vor dem Doppelpunkt kein Teilnehmer
+    (`Familie Müller: Anna, Ben`), ist das eine Beschriftung und die Zeile eine Gruppe.
+    Unbekannte Namen werden ignoriert; ist `warnings` eine Liste, landen Hinweise auf
+    Beschriftungen sowie ignorierte Namen und Zeilen darin.
+    Liefert `(groups, exclusions)` mit Tupeln bzw. einem Dict Name → Liste.
+    """
+    groups = []
+    exclusions = {}
+    if not pairs_text:
+        return groups, exclusions
+
+    lines = [l.strip() for l in pairs_text.split('\n') if l.strip()]
+    name_lower = {n.lower(): n for n in names}
+    unknown = []
+
+    for line in lines:
+        original = line
+        giver = None
+        if ':' in line:
+            head, line = line.split(':', 1)
+            giver = name_lower.get(head.strip().lower())
+            if giver is None and warnings is not None:
+                # Kann auch ein Tippfehler im Namen des Schenkenden sein – daher melden.
+                warnings.append(f"„{head.strip()}“ ist kein Teilnehmer – Zeile als Gruppe behandelt: {original}")
+        parts = [p.strip() for p in line.split(',') if p.strip()]
+        unknown.extend(p for p in parts if p.lower() not in name_lower and p not in unknown)
+        members = list(dict.fromkeys(name_lower[p.lower()] for p in parts if p.lower() in name_lower))
+        if giver is not None:
+            targets = [m for m in members if m != giver]
+            if targets:
+                existing = exclusions.setdefault(giver, [])
+                existing.extend(t for t in targets if t not in existing)
+            elif warnings is not None:
+                warnings.append(f"Zeile ignoriert (keine bekannten Namen nach dem Doppelpunkt): {original}")
+        elif len(members) >= 2:
+            groups.append(tuple(members))
+        elif warnings is not None:
+            warnings.append(f"Zeile ignoriert (weniger als zwei bekannte Namen): {original}")
+
+    if unknown and warnings is not None:
+        warnings.append("Unbekannte Namen ignoriert: " + ", ".join(unknown))
+    return groups, exclusions
+
+def parse_pairs(pairs_text, names):
+    """Parst Paare bzw. Gruppen beliebiger Größe aus dem Textfeld"""
+    return parse_constraints(pairs_text, names)[0]
+
+def find_receiver(assignments, name, code):
+    """Sucht den Empfänger zu Name und persönlichem Code (None, wenn nicht gefunden)."""
+    for item in assignments:
+        if item['name'].upper() == name.upper() and item['code'] == code:
+            return item['receiver']
+    return None
+
+def _constraint_tables(names, groups, exclusions=None):
+    """Übersetzt Gruppen und Ausschlusslisten in zwei Nachschlagetabellen pro Teilnehmer.
+
+    `group_of[i]` ist die Gruppe von Person i (-1 ohne Gruppe). `blocked[i]` enthält die
+    Positionen, die Person i zusätzlich nicht beschenken darf: persönliche Ausschlüsse
+    sowie alle Gruppen von Personen, die in mehreren Gruppen stehen. Damit ist jede
+    Prüfung im Solver ein Array-Zugriff bzw. ein Set-Lookup, unabhängig von der Rundengröße.
+    """
+    positions = {}
+    for i, name in enumerate(names):
+        positions.setdefault(name.lower(), []).append(i)
+
+    member_groups = []
+    memberships = [0] * len(names)
+    for group in groups:
+        members = sorted({i for member in group for i in positions.get(member.lower(), ())})
+        member_groups.append(members)
+        for i in members:
+            memberships[i] += 1
+
+    group_of = array("l", [-1]) * len(names)
+    blocked = [set() for _ in names]
+    for group_id, members in enumerate(member_groups):
+        for i in members:
+            if group_of[i] == -1:
+                group_of[i] = group_id
+        # Wer in mehreren Gruppen ist, passt nicht in `group_of`; seine weiteren
+        # Gruppen werden paarweise in `blocked` eingetragen.
+        for m in members:
+            if memberships[m] > 1:
+                for x in members:
+                    if x != m:
+                        blocked[m].add(x)
+                        blocked[x].add(m)
+
+    for giver, targets in (exclusions or {}).items():
+        indices = [j for target in targets for j in positions.get(target.lower(), ())]
+        for i in positions.get(giver.lower(), ()):
+            blocked[i].update(indices)
+
+    empty = frozenset()
+    return group_of, [frozenset(b) if b else empty for b in blocked]
+
+def generate_assignment(names, pairs, allow_self=False, max_attempts=5000, rng=None, exclusions=None):
+    """Generiert eine Wichtel-Zuteilung mit Gruppen-Schutz (niemand beschenkt ein Mitglied seiner Gruppe).
+
+    `pairs` sind Gruppen beliebiger Größe, `exclusions` ordnet Namen persönliche
+    Ausschlusslisten zu. `rng` muss `shuffle` anbieten (Default: Modul `random`); mit
+    einem `KeyedRandom` ist das Ergebnis für denselben Seed reproduzierbar.
+    """
+    rng = rng or random
+    if len(names) == 0:
+        return None
+    if len(names) == 1 and allow_self:
+        return [(names[0], names[0])]
+    if len(names) == 1:
+        return None
+
+    n = len(names)
+    indices = list(range(n))
+    group_of, blocked = _constraint_tables(names, pairs, exclusions)
+
+    def is_valid(perm):
+        for giver_idx, receiver_idx in enumerate(perm):
+            if giver_idx == receiver_idx:
+                # Regel 1: Keine Selbstzuweisung (außer erlaubt)
+                if not allow_self:
+                    return False
+            # Regel 2 + 3: Keine gemeinsame Gruppe, kein persönlicher Ausschluss
+            elif group_of[giver_idx] == group_of[receiver_idx] != -1 or receiver_idx in blocked[giver_idx]:
+                return False
+        return True
+
+    for attempt in range(max_attempts):
+        perm = indices.copy()
+        rng.shuffle(perm)
+
+        if is_valid(perm):
+            return [(names[i], names[perm[i]]) for i in range(n)]
+
+    # Fallback: Rotation — aber nur wenn sie nicht gegen Ausschlüsse verstößt
+    if not allow_self and n > 1:
+        rotation = [(i + 1) % n for i in range(n)]
+        if is_valid(rotation):
+            return [(names[i], names[rotation[i]]) for i in range(n)]
+
+    return None
+
+
+# Deterministischer Modus: Zuteilung und Codes werden aus einem geheimen Seed abgeleitet,
+# gespeichert werden nur Teilnehmerliste, Paare und der versiegelte Seed.
+class KeyedRandom:
+    """Kryptographischer Zufallsstrom aus HMAC-SHA256(seed, Zähler).
+
+    Implementiert Fisher-Yates selbst, damit Ergebnisse nicht von der
+    `random`-Implementierung der Python-Version abhängen.
+    """
+
+    def __init__(self, seed: bytes, label: bytes = b"assignment"):
+        self._seed = seed
+        self._label = label
+        self._counter = 0
+        self._buffer = b""
+
+    def _next_bytes(self, n: int) -> bytes:
+        while len(self._buffer) < n:
+            block = hmac.new(
+                self._seed, self._label + b"\0" + self._counter.to_bytes(8, "big"), hashlib.sha256
+            ).digest()
+            self._buffer += block
+            self._counter += 1
+        chunk, self._buffer = self._buffer[:n], self._buffer[n:]
+        return chunk
+
+    def randbelow(self, n: int) -> int:
+        if n <= 0:
+            raise ValueError("n must be positive")
+        limit = (1 << 64) - (1 << 64) % n
+        while True:
+            value = int.from_bytes(self._next_bytes(8), "big")
+            if value < limit:
+                return value % n
+
+    def shuffle(self, seq) -> None:
+        for i in range(len(seq) - 1, 0, -1):
+            j = self.randbelow(i + 1)
+            seq[i], seq[j] = seq[j], seq[i]
+
+
+def _generate_assignment_v1(names, pairs, allow_self=False, max_attempts=5000, rng=None, exclusions=None):
+    """Eingefrorener Solver der ersten Seed-Sessions (nur Paare, keine Ausschlusslisten).
+
+    Nicht ändern: Seed-Sessions mit `algo` 1 werden beim Laden hiermit neu berechnet.
+    """
+    if exclusions:
+        raise ValueError("Seed algorithm 1 does not support exclusions")
+    rng = rng or random
+    if len(names) == 0:
+        return None
+    if len(names) == 1 and allow_self:
+        return [(names[0], names[0])]
+    if len(names) == 1:
+        return None
+
+    pair_map = {}
+    for a, b in pairs:
+        pair_map[a.lower()] = b.lower()
+        pair_map[b.lower()] = a.lower()
+
+    n = len(names)
+    indices = list(range(n))
+    names_lower = [n_.lower() for n_ in names]
+
+    for attempt in range(max_attempts):
+        perm = indices.copy()
+        rng.shuffle(perm)
+
+        valid = True
+        for i in range(n):
+            giver_idx = i
+            receiver_idx = perm[i]
+
+            if not allow_self and giver_idx == receiver_idx:
+                valid = False
+                break
+
+            giver = names_lower[giver_idx]
+            receiver = names_lower[receiver_idx]
+
+            partner = pair_map.get(giver)
+            if partner and partner == receiver:
+                valid = False
+                break
+
+        if valid:
+            return [(names[i], names[perm[i]]) for i in range(n)]
+
+    if not allow_self and n > 1:
+        rotation = [(names[i], names[(i + 1) % n]) for i in range(n)]
+        conflict = False
+        for giver, receiver in rotation:
+            if pair_map.get(giver.lower()) == receiver.lower():
+                conflict = True
+                break
+        if not conflict:
+            return rotation
+
+    return None
+
+
+_SEEDED_SOLVERS = {
+    1: _generate_assignment_v1,
+    2: generate_assignment,
+}
+
+
+def generate_seeded_assignment(seed: bytes, names, pairs, allow_self=False, exclusions=None, algo=SEED_ALGORITHM):
+    """Zuteilung als (Schenker, Empfänger)-Paare aus dem Seed mit Solver-Version `algo`."""
+    solver = _SEEDED_SOLVERS.get(algo)
+    if solver is None:
+        raise ValueError(f"Unknown seed algorithm: {algo}")
+    return solver(list(names), [tuple(p) for p in pairs], allow_self, rng=KeyedRandom(seed), exclusions=exclusions)
+
+
+def new_seed() -> bytes:
+    """Erzeugt einen neuen geheimen Session-Seed."""
+    return secrets.token_bytes(SEED_BYTES)
+
+
+def derive_code(seed: bytes, name: str, length=6) -> str:
+    """Leitet den persönlichen Code einer Person aus dem Seed ab (unabhängig von allen anderen)."""
+    rng = KeyedRandom(seed, b"code\0" + name.encode("utf-8"))
+    return ''.join(CODE_CHARS[rng.randbelow(len(CODE_CHARS))] for _ in range(length))
+
+
+@functools.lru_cache(maxsize=256)
+def _seeded_receivers(seed: bytes, names: tuple, pairs: tuple, allow_self: bool, exclusions: tuple = (), algo=SEED_ALGORITHM):
+    result = generate_seeded_assignment(
+        seed, names, pairs, allow_self, {giver: list(targets) for giver, targets in exclusions}, algo
+    )
+    if result is None:
+        return None
+    return tuple(receiver for _, receiver in result)
+
+
+@functools.lru_cache(maxsize=256)
+def _seeded_codes(seed: bytes, names: tuple):
+    return tuple(derive_code(seed, giver) for giver in names)
+
+
+def _freeze(names, pairs, exclusions=None):
+    frozen_exclusions = tuple(sorted((giver, tuple(targets)) for giver, targets in (exclusions or {}).items()))
+    return tuple(names), tuple(tuple(p) for p in pairs), frozen_exclusions
+
+
+def derive_seeded_assignments(seed: bytes, names, pairs, allow_self=False, exclusions=None, algo=SEED_ALGORITHM):
+    """Berechnet die komplette Zuteilung (Liste von name/code/receiver) aus dem Seed."""
+    frozen_names, frozen_pairs, frozen_exclusions = _freeze(names, pairs, exclusions)
+    receivers = _seeded_receivers(seed, frozen_names, frozen_pairs, allow_self, frozen_exclusions, algo)
+    if receivers is None:
+        return None
+    return [
+        {"name": giver, "code": code, "receiver": receiver}
+        for giver, code, receiver in zip(names, _seeded_codes(seed, frozen_names), receivers)
+    ]
+
+
+def find_seeded_receiver(seed: bytes, names, pairs, allow_self, name, code, exclusions=None, algo=SEED_ALGORITHM):
+    """Wie `find_receiver`, leitet aber nur den Code der gesuchten Person ab.
+
+    Die Zuteilung wird erst nach passendem Code berechnet (und pro Seed gecacht).
+    """
+    wanted = name.upper()
+    for index, giver in enumerate(names):
+        if giver.upper() == wanted and derive_code(seed, giver) == code:
+            frozen_names, frozen_pairs, frozen_exclusions = _freeze(names, pairs, exclusions)
+            receivers = _seeded_receivers(seed, frozen_names, frozen_pairs, allow_self, frozen_exclusions, algo)
+            return receivers[index] if receivers else None
+    return None
+
+
+class SeedKeyError(ValueError):
+    """Versiegelter Seed lässt sich nicht öffnen (Schlüssel fehlt, falsch oder Daten beschädigt)."""
+
+
+def _seal_key(key: str) -> bytes:
+    return hashlib.sha256(b"wichtel-seed-seal\0" + key.encode("utf-8")).digest()
+
+
+def seal_seed(seed: bytes, key: str) -> str:
+    """Verschlüsselt und authentifiziert den Seed mit dem Server-Schlüssel."""
+    seal_key = _seal_key(key)
+    nonce = secrets.token_bytes(16)
+    stream = hmac.new(seal_key, b"stream" + nonce, hashlib.sha256).digest()
+    ciphertext = bytes(a ^ b for a, b in zip(seed, stream))
+    tag = hmac.new(seal_key, b"tag" + nonce + ciphertext, hashlib.sha256).digest()[:16]
+    return _SEAL_PREFIX + base64.urlsafe_b64encode(nonce + ciphertext + tag).decode("ascii")
+
+
+def unseal_seed(sealed: str, key: str) -> bytes:
+    """Gegenstück zu `seal_seed`; wirft SeedKeyError bei falschem Schlüssel oder Manipulation."""
+    if not sealed.startswith(_SEAL_PREFIX):
+        raise SeedKeyError("Unknown seed format")
+    try:
+        raw = base64.urlsafe_b64decode(sealed[len(_SEAL_PREFIX):])
+    except binascii.Error as exc:
+        raise SeedKeyError("Unknown seed format") from exc
+    nonce, ciphertext, tag = raw[:16], raw[16:-16], raw[-16:]
+    seal_key = _seal_key(key)
+    expected = hmac.new(seal_key, b"tag" + nonce + ciphertext, hashlib.sha256).digest()[:16]
+    if len(ciphertext) != SEED_BYTES or not hmac.compare_digest(tag, expected):
+        raise SeedKeyError("Sealed seed could not be verified")
+    stream = hmac.new(seal_key, b"stream" + nonce, hashlib.sha256).digest()
+    return bytes(a ^ b for a, b in zip(ciphertext, stream))
+
+
+def _generate_group(names, pairs, allow_self, exclusions=None):
+    result = generate_assignment(names, pairs, allow_self, exclusions=exclusions)
+    if result is None:
+        return {"assignments": None, "codes": {}, "error": "Keine gültige Zuteilung gefunden"}
+    return {
+        "assignments": result,
+        "codes": {giver: generate_code() for giver, _ in result},
+        "error": None,
+    }
+
+
+def _error_result(exc):
+    return {"assignments": None, "codes": {}, "error": f"{type(exc).__name__}: {exc}"}
+
+
+def _batch_errors(batch, exc):
+    return [(index, _error_result(exc)) for index, _ in batch]
+
+
+def _generate_group_batch(batch):
+    """Worker: erzeugt Zuteilungen für eine Liste von (Index, Gruppe)-Einträgen."""
+    results = []
+    for index, (names, pairs, allow_self, *rest) in batch:
+        try:
+            results.append((index, _generate_group(list(names), list(pairs), allow_self, *rest)))
+        except Exception as exc:  # Fehler einer Gruppe soll die übrigen nicht abbrechen
+            results.append((index, _error_result(exc)))
+    return results
+
+
+def _available_cpus():
+    # Berücksichtigt CPU-Affinität (taskset, cgroups-cpusets) statt aller Kerne des Hosts.
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count()
+
+
+def iter_group_assignments(groups, max_workers=None, chunksize=None):
+    """Verteilt viele unabhängige Gruppen auf einen Prozess-Pool.
+
+    `groups` ist eine Folge von `(names, pairs, allow_self)`-Tupeln, optional mit
+    persönlichen Ausschlüssen als viertem Element. Liefert
+    `(index, result)` in der Reihenfolge, in der die Worker fertig werden; `result`
+    enthält `assignments`, `codes` und `error` (None bei Erfolg). Stirbt ein Worker,
+    bricht `ProcessPoolExecutor` alle offenen Batches mit `BrokenProcessPool` ab; diese
+    werden einmal erneut ausgeführt, einzeln in einem frischen Pool, sodass am Ende nur
+    die Gruppen des Batches mit dem abstürzenden Worker einen Fehler erhalten.
+    """
+    groups = list(groups)
+    if not groups:
+        return
+    workers = max_workers or _available_cpus() or 1
+    workers = min(workers, len(groups))
+    if chunksize is None:
+        # Mehrere Batches pro Worker gleichen unterschiedlich große Gruppen aus,
+        # ohne für jede Gruppe einzeln Pickling-Overhead zu bezahlen.
+        chunksize = max(1, len(groups) // (workers * 4))
+
+    indexed = list(enumerate(groups))
+    batches = [indexed[i:i + chunksize] for i in range(0, len(indexed), chunksize)]
+
+    # "spawn" statt "fork": der Streamlit-Server ist multithreaded, und frische
+    # Prozesse starten außerdem mit eigenem Zufallszustand.
+    context = multiprocessing.get_context("spawn")
+    unfinished = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = {}
+        for position, batch in enumerate(batches):
+            try:
+                futures[executor.submit(_generate_group_batch, batch)] = batch
+            except BrokenProcessPool:
+                unfinished.extend(batches[position:])
+                break
+        for future in as_completed(futures):
+            try:
+                results = future.result()
+            except BrokenProcessPool:
+                unfinished.append(futures[future])
+                continue
+            except Exception as exc:
+                results = _batch_errors(futures[future], exc)
+            yield from results
+
+    # Seltener Fehlerpfad: ein Batch nach dem anderen, damit ein erneuter Absturz
+    # eindeutig seinem Batch zugeordnet wird und die übrigen nicht mitreißt.
+    unfinished.sort(key=lambda batch: batch[0][0])
+    executor = None
+    try:
+        for batch in unfinished:
+            executor = executor or ProcessPoolExecutor(max_workers=1, mp_context=context)
+            try:
+                results = executor.submit(_generate_group_batch, batch).result()
+            except BrokenProcessPool as exc:
+                executor.shutdown()
+                executor = None
+                results = _batch_errors(batch, exc)
+            except Exception as exc:
+                results = _batch_errors(batch, exc)
+            yield from results
+    finally:
+        if executor:
+            executor.shutdown()
+
+
+def generate_group_assignments(groups, max_workers=None, chunksize=None):
+    """Generiert Zuteilungen für viele Gruppen parallel (Ergebnisliste in Eingabereihenfolge)."""
+    groups = list(groups)
+    results = [None] * len(groups)
+    for index, result in iter_group_assignments(groups, max_workers, chunksize):
+        results[index] = result
+    return results
@@ -0,0 +1,602 @@
+"""Supabase-Zugriff und Session-Speicherung des Wichtel-Zuteilers ohne Streamlit-UI.
+
+`wichtel.py` baut die Oberfläche darauf auf; Lasttest und Cron-Jobs (siehe `tools/`)
+importieren nur dieses Modul, damit beim Import keine Seite gerendert wird.
+Streamlit wird nur für `st.secrets` genutzt, falls vorhanden.
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+from assignment import (
+    SEED_ALGORITHM,
+    SeedKeyError,
+    derive_seeded_assignments,
+    find_receiver,
+    find_seeded_receiver,
+    seal_seed,
+    unseal_seed,
+)
+from session_cache import SharedSessionCache
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_SQL_PATH = "supabase/schema.sql"
+_schema_hint_logged = False
+_supabase_sql_rpc_available = True
+
+def _resolve_supabase_settings():
+    schema = os.getenv("SUPABASE_SCHEMA", "public")
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY")
+
+    try:
+        import streamlit as st  # nur für st.secrets; rendert nichts
+
+        supabase_secrets = st.secrets.get("connections", {}).get("supabase", {})
+        url = supabase_secrets.get("url", url)
+        key = supabase_secrets.get("key", key)
+        schema = supabase_secrets.get("schema", schema)
+    except Exception:  # pragma: no cover - st.secrets may not be available in tests
+        pass
+
+    if not url or not key:
+        raise RuntimeError(
+            "Supabase credentials missing. Please configure SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY or st.secrets."
+        )
+
+    return url, key, schema
+
+
+SUPABASE_URL, SUPABASE_KEY, SUPABASE_SCHEMA = _resolve_supabase_settings()
+
+
+def _resolve_seed_key() -> str | None:
+    key = os.getenv("WICHTEL_SEED_KEY")
+
+    try:
+        import streamlit as st  # nur für st.secrets; rendert nichts
+
+        key = st.secrets.get("wichtel", {}).get("seed_key", key)
+    except Exception:  # pragma: no cover - st.secrets may not be available in tests
+        pass
+
+    return key or None
+
+
+# Eigener Schlüssel zum Versiegeln der Session-Seeds (deterministischer Modus). Ohne ihn
+# ist der Seed-Modus deaktiviert; ein Wechsel macht bestehende Seed-Sessions unlesbar.
+SEED_SEAL_KEY = _resolve_seed_key()
+
+
+def _resolve_session_cache() -> SharedSessionCache | None:
+    directory = os.getenv("WICHTEL_SHARED_CACHE_DIR")
+    if not directory:
+        return None
+    ttl = float(os.getenv("WICHTEL_SHARED_CACHE_TTL", "300"))
+    return SharedSessionCache(directory, ttl=ttl)
+
+
+# Optionaler Cache, den alle Worker-Prozesse eines Hosts teilen (None = deaktiviert).
+SESSION_CACHE = _resolve_session_cache()
+# Sessions älter als diese Anzahl Tage gelten als abgelaufen (None = nie).
+SESSION_TTL_DAYS = float(os.getenv("WICHTEL_SESSION_TTL_DAYS") or 0) or None
+
+
+class SessionExpiredError(Exception):
+    """Die Session existiert, ist aber älter als `SESSION_TTL_DAYS`."""
+
+    def __init__(self, created_at: str | None = None):
+        super().__init__("Session expired")
+        self.created_at = created_at
+
+def _supabase_base_url() -> str:
+    return SUPABASE_URL.rstrip("/")
+
+
+def _supabase_table_endpoint(table: str) -> str:
+    return f"{_supabase_base_url()}/rest/v1/{table}"
+
+
+def _supabase_sql_endpoint() -> str:
+    return f"{_supabase_base_url()}/rest/v1/rpc/sql"
+
+
+def _supabase_headers(*, write: bool = False, prefer: list[str] | None = None, include_count: bool = False) -> dict[str, str]:
+    headers = {
+        "apikey": SUPABASE_KEY,
+        "Authorization": f"Bearer {SUPABASE_KEY}",
+    }
+    schema = SUPABASE_SCHEMA or "public"
+    if schema != "public":
+        profile_header = "Content-Profile" if write else "Accept-Profile"
+        headers[profile_header] = schema
+
+    prefer_clauses: list[str] = []
+    if prefer:
+        prefer_clauses.extend(prefer)
+    if include_count:
+        prefer_clauses.append("count=exact")
+    if prefer_clauses:
+        headers["Prefer"] = ",".join(dict.fromkeys(filter(None, prefer_clauses)))
+    return headers
+
+
+def _supabase_execute_sql(query: str) -> None:
+    headers = _supabase_headers(write=True)
+    headers["Content-Type"] = "application/json"
+    response = requests.post(_supabase_sql_endpoint(), headers=headers, json={"query": query}, timeout=60)
+    if response.status_code != 200:
+        raise RuntimeError(f"Supabase SQL error: {response.status_code} {response.text}")
+
+
+def _ensure_supabase_schema() -> None:
+    global _schema_hint_logged, _supabase_sql_rpc_available
+    if not _supabase_sql_rpc_available:
+        return
+    schema = SUPABASE_SCHEMA or "public"
+    table = f"{schema}.sessions"
+    ddl = f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        id BIGSERIAL PRIMARY KEY,
+        user_password TEXT NOT NULL,
+        user_password_hash TEXT NOT NULL UNIQUE,
+        admin_code_hash TEXT UNIQUE,
+        assignments_json TEXT NOT NULL,
+        pairs_json TEXT,
+        created_at TIMESTAMPTZ NOT NULL
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_sessions_admin_code_hash ON {table}(admin_code_hash);
+    CREATE INDEX IF NOT EXISTS idx_sessions_created_at ON {table}(created_at);
+    CREATE TABLE IF NOT EXISTS {schema}.sessions_archive (
+        id BIGINT PRIMARY KEY,
+        user_password_hash TEXT NOT NULL,
+        admin_code_hash TEXT,
+        created_at TIMESTAMPTZ NOT NULL,
+        archived_at TIMESTAMPTZ NOT NULL,
+        payload TEXT NOT NULL
+    );
+    """
+    try:
+        _supabase_execute_sql(ddl)
+        _schema_hint_logged = False
+    except Exception as exc:  # pragma: no cover - network dependent
+        message = str(exc)
+        if "public.sql" in message or "PGRST202" in message:
+            _supabase_sql_rpc_available = False
+            if not _schema_hint_logged:
+                logger.info(
+                    "Supabase SQL RPC endpoint is not available (function public.sql missing). "
+                    "Manual setup is required; skipping further automatic attempts."
+                )
+                logger.info(
+                    "Execute the statements from `%s` once in the Supabase SQL editor or CLI.",
+                    SCHEMA_SQL_PATH,
+                )
+                _schema_hint_logged = True
+        else:
+            if not _schema_hint_logged:
+                logger.warning("Could not ensure Supabase schema automatically: %s", exc)
+                logger.warning(
+                    "Please execute the SQL statements from `%s` once in the Supabase SQL editor or via the CLI.",
+                    SCHEMA_SQL_PATH,
+                )
+                _schema_hint_logged = True
+
+
+def _supabase_upsert_session(payload: dict[str, str | None]) -> None:
+    headers = _supabase_headers(
+        write=True,
+        prefer=["resolution=merge-duplicates", "return=minimal"],
+    )
+    headers["Content-Type"] = "application/json"
+    params = {"on_conflict": "user_password_hash"}
+    response = requests.post(
+        _supabase_table_endpoint("sessions"),
+        headers=headers,
+        params=params,
+        json=[payload],
+        timeout=60,
+    )
+    if response.status_code == 404:
+        _ensure_supabase_schema()
+        response = requests.post(
+            _supabase_table_endpoint("sessions"),
+            headers=headers,
+            params=params,
+            json=[payload],
+            timeout=60,
+        )
+    if response.status_code == 404:
+        raise RuntimeError(
+            "Supabase table 'sessions' is missing. Please run the SQL from "
+            f"`{SCHEMA_SQL_PATH}` on your Supabase project to create it."
+        )
+    if response.status_code not in (200, 201, 204):
+        raise RuntimeError(f"Supabase upsert failed: {response.status_code} {response.text}")
+
+
+SESSION_COLUMNS = "id,user_password,user_password_hash,admin_code_hash,assignments_json,pairs_json,created_at"
+
+
+def _supabase_fetch_single(
+    field: str, value: str, *, columns: str = SESSION_COLUMNS, created_after: str | None = None
+) -> dict[str, str] | None:
+    params = {
+        "select": columns,
+        field: f"eq.{value}",
+        "limit": "1",
+    }
+    if created_after:
+        params["created_at"] = f"gte.{created_after}"
+    response = requests.get(
+        _supabase_table_endpoint("sessions"),
+        headers=_supabase_headers(include_count=False),
+        params=params,
+        timeout=60,
+    )
+    if response.status_code == 404:
+        # Supabase can take a moment to realise a freshly created table exists.
+        _ensure_supabase_schema()
+        return None
+        return None
+    if response.status_code not in (200, 206):
+        raise RuntimeError(f"Supabase query failed: {response.status_code} {response.text}")
+    records = response.json()
+    if not records:
+        return None
+    return records[0]
+
+
+def _supabase_fetch_expired_batch(cutoff: str, limit: int, columns: str) -> list[dict]:
+    params = {
+        "select": columns,
+        "created_at": f"lt.{cutoff}",
+        "order": "created_at.asc",
+        "limit": str(limit),
+    }
+    response = requests.get(
+        _supabase_table_endpoint("sessions"),
+        headers=_supabase_headers(),
+        params=params,
+        timeout=60,
+    )
+    if response.status_code not in (200, 206):
+        raise RuntimeError(f"Supabase query failed: {response.status_code} {response.text}")
+    return response.json()
+
+
+def _supabase_archive_sessions(rows: list[dict]) -> None:
+    headers = _supabase_headers(
+        write=True,
+        prefer=["resolution=merge-duplicates", "return=minimal"],
+    )
+    headers["Content-Type"] = "application/json"
+    response = requests.post(
+        _supabase_table_endpoint("sessions_archive"),
+        headers=headers,
+        params={"on_conflict": "id"},
+        json=rows,
+        timeout=60,
+    )
+    if response.status_code not in (200, 201, 204):
+        raise RuntimeError(f"Supabase archive failed: {response.status_code} {response.text}")
+
+
+def _supabase_delete_sessions(ids: list, cutoff: str) -> list:
+    """Löscht die Zeilen `ids`, sofern sie noch älter als `cutoff` sind; liefert die gelöschten IDs."""
+    # Der created_at-Filter schützt Zeilen, die seit dem Auslesen neu gespeichert wurden.
+    response = requests.delete(
+        _supabase_table_endpoint("sessions"),
+        headers=_supabase_headers(write=True, prefer=["return=representation"]),
+        params={
+            "select": "id",
+            "id": f"in.({','.join(str(i) for i in ids)})",
+            "created_at": f"lt.{cutoff}",
+        },
+        timeout=60,
+    )
+    # Nur 200 trägt die gelöschten Zeilen; ein 204 (leerer Body) hieße, dass
+    # `return=representation` ignoriert wurde und die IDs unbekannt sind.
+    if response.status_code != 200:
+        raise RuntimeError(f"Supabase delete failed: {response.status_code} {response.text}")
+    return [row["id"] for row in response.json()]
+
+
+def init_database() -> None:
+    """Initialisiert die Supabase-Datenbank und legt Tabellen an."""
+    _ensure_supabase_schema()
+
+
+def hash_user_password(password: str) -> str:
+    return hashlib.sha256(password.encode("utf-8")).hexdigest()
+
+
+def hash_admin_code(code: str) -> str:
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+def _encode_constraints(pairs: list, exclusions: dict | None) -> str:
+    # Ohne persönliche Ausschlüsse bleibt pairs_json eine reine Liste (altes Format).
+    if not exclusions:
+        return json.dumps(pairs, ensure_ascii=False)
+    return json.dumps({"groups": pairs, "exclusions": exclusions}, ensure_ascii=False)
+
+
+def _decode_constraints(pairs_json: str | None) -> tuple[list, dict]:
+    if not pairs_json:
+        return [], {}
+    stored = json.loads(pairs_json)
+    if isinstance(stored, dict):
+        return stored.get("groups", []), stored.get("exclusions", {})
+    return stored, {}
+
+
+def _save_session_payload(
+    user_password: str, admin_code: str, assignments_json: str, pairs: list, exclusions: dict | None = None
+) -> None:
+    pairs_json = _encode_constraints(pairs, exclusions)
+    user_hash = hash_user_password(user_password)
+    admin_hash = hash_admin_code(admin_code)
+    timestamp = datetime.utcnow().replace(tzinfo=timezone.utc).isoformat()
+
+    payload = {
+        "user_password": user_password,
+        "user_password_hash": user_hash,
+        "admin_code_hash": admin_hash,
+        "assignments_json": assignments_json,
+        "pairs_json": pairs_json,
+        "created_at": timestamp,
+    }
+    _supabase_upsert_session(payload)
+    if SESSION_CACHE:
+        SESSION_CACHE.invalidate(
+            _cache_key("user_password_hash", user_hash),
+            _cache_key("admin_code_hash", admin_hash),
+        )
+
+
+def save_session_to_db(
+    user_password: str, admin_code: str, assignments: list, pairs: list, exclusions: dict | None = None
+) -> None:
+    assignments_json = json.dumps(assignments, ensure_ascii=False)
+    _save_session_payload(user_password, admin_code, assignments_json, pairs, exclusions)
+
+
+def save_seeded_session_to_db(
+    user_password: str,
+    admin_code: str,
+    names: list,
+    pairs: list,
+    seed: bytes,
+    allow_self: bool = False,
+    exclusions: dict | None = None,
+    algo: int = SEED_ALGORITHM,
+) -> None:
+    """Speichert nur Teilnehmerliste, Paare und den versiegelten Seed statt der kompletten Zuteilung.
+
+    `algo` ist die Solver-Version, mit der die Zuteilung aus dem Seed berechnet wurde;
+    beim erneuten Speichern einer geladenen Session muss deren Version erhalten bleiben.
+    """
+    if not SEED_SEAL_KEY:
+        raise RuntimeError("Seed mode requires WICHTEL_SEED_KEY or st.secrets['wichtel']['seed_key'].")
+    assignments_json = json.dumps(
+        {
+            "mode": "seed",
+            "algo": algo,
+            "roster": list(names),
+            "allow_self": allow_self,
+            "seed": seal_seed(seed, SEED_SEAL_KEY),
+        },
+        ensure_ascii=False,
+    )
+    _save_session_payload(user_password, admin_code, assignments_json, pairs, exclusions)
+
+
+def _decode_session_record(record: dict) -> dict:
+    data = {
+        "id": record.get("id"),
+        "user_password": record.get("user_password"),
+    }
+    data["pairs"], data["exclusions"] = _decode_constraints(record.get("pairs_json"))
+    stored = json.loads(record["assignments_json"])
+    if isinstance(stored, dict) and stored.get("mode") == "seed":
+        # Empfänger und Codes werden erst bei Bedarf aus dem Seed abgeleitet.
+        data["roster"] = stored["roster"]
+        # Sessions ohne "algo" stammen aus der ersten Version des Seed-Modus.
+        data["algo"] = stored.get("algo", 1)
+        data["allow_self"] = stored.get("allow_self", False)
+        data["sealed_seed"] = stored["seed"]
+    else:
+        data["assignments"] = stored
+    return data
+
+
+def session_seed(data: dict) -> bytes | None:
+    """Entsiegelter Seed; SeedKeyError, wenn der Schlüssel fehlt oder nicht passt."""
+    if "sealed_seed" not in data:
+        return None
+    if not SEED_SEAL_KEY:
+        raise SeedKeyError("No seed key configured")
+    return unseal_seed(data["sealed_seed"], SEED_SEAL_KEY)
+
+
+def session_participants(data: dict) -> list:
+    if "roster" in data:
+        return data["roster"]
+    return [item["name"] for item in data["assignments"]]
+
+
+def session_assignments(data: dict) -> list:
+    """Liefert die Zuteilung als Liste von name/code/receiver, auch für Seed-Sessions."""
+    if "assignments" in data:
+        return data["assignments"]
+    return derive_seeded_assignments(
+        session_seed(data), data["roster"], data["pairs"], data["allow_self"], data.get("exclusions"), data["algo"]
+    ) or []
+
+
+def lookup_receiver(data: dict, name: str, code: str):
+    """Empfänger zu Name + Code; Seed-Sessions leiten nur den Eintrag dieser Person ab."""
+    if "assignments" in data:
+        return find_receiver(data["assignments"], name, code)
+    return find_seeded_receiver(
+        session_seed(data),
+        data["roster"],
+        data["pairs"],
+        data["allow_self"],
+        name,
+        code,
+        data.get("exclusions"),
+        data["algo"],
+    )
+
+
+def _cache_key(field: str, value: str) -> str:
+    return f"{field}-{value}"
+
+
+def _cached_session_entry(field: str, hashed: str) -> dict | None:
+    entry = SESSION_CACHE.get(_cache_key(field, hashed))
+    if entry and field == "admin_code_hash":
+        # Admin-Einträge verweisen nur auf den User-Eintrag; so reicht es beim Speichern,
+        # den User-Eintrag zu invalidieren, auch wenn sich der Admin-Code geändert hat.
+        entry = SESSION_CACHE.get(_cache_key("user_password_hash", entry["user_password_hash"]))
+        if entry and entry["admin_code_hash"] != hashed:
+            return None
+    return entry
+
+
+def _session_cutoff(ttl_days: float | None = None) -> datetime | None:
+    """Ältester noch gültiger Zeitpunkt; None, wenn Sessions nicht ablaufen (TTL fehlt oder 0)."""
+    if ttl_days is None:
+        ttl_days = SESSION_TTL_DAYS
+    if not ttl_days:
+        return None
+    return datetime.now(timezone.utc) - timedelta(days=ttl_days)
+
+
+def _load_session_entry(field: str, hashed: str) -> dict | None:
+    cutoff = _session_cutoff()
+    if SESSION_CACHE:
+        entry = _cached_session_entry(field, hashed)
+        if entry:
+            if cutoff and datetime.fromisoformat(entry["created_at"]) < cutoff:
+                raise SessionExpiredError(entry["created_at"])
+            return entry
+
+    # Zeitpunkt vor dem Lesen: war der Eintrag seitdem invalidiert, wird nicht gecacht.
+    fetched_at = time.time()
+    record = _supabase_fetch_single(field, hashed, created_after=cutoff.isoformat() if cutoff else None)
+    if not record:
+        if cutoff:
+            # Nur id/created_at nachladen, um "abgelaufen" von "unbekannt" zu unterscheiden.
+            stub = _supabase_fetch_single(field, hashed, columns="id,created_at")
+            if stub:
+                raise SessionExpiredError(stub.get("created_at"))
+        return None
+
+    entry = {
+        "data": _decode_session_record(record),
+        "created_at": record.get("created_at"),
+        "user_password_hash": record.get("user_password_hash"),
+        "admin_code_hash": record.get("admin_code_hash"),
+    }
+    if SESSION_CACHE and entry["user_password_hash"]:
+        SESSION_CACHE.set(
+            _cache_key("user_password_hash", entry["user_password_hash"]), entry, fetched_at=fetched_at
+        )
+        if entry["admin_code_hash"]:
+            SESSION_CACHE.set(
+                _cache_key("admin_code_hash", entry["admin_code_hash"]),
+                {"user_password_hash": entry["user_password_hash"]},
+                fetched_at=fetched_at,
+            )
+    return entry
+
+
+def _archive_row(record: dict, archived_at: str) -> dict:
+    payload = json.dumps(
+        {key: record.get(key) for key in ("user_password", "assignments_json", "pairs_json")},
+        ensure_ascii=False,
+    )
+    return {
+        "id": record["id"],
+        "user_password_hash": record["user_password_hash"],
+        "admin_code_hash": record.get("admin_code_hash"),
+        "created_at": record["created_at"],
+        "archived_at": archived_at,
+        "payload": base64.b64encode(zlib.compress(payload.encode("utf-8"), 9)).decode("ascii"),
+    }
+
+
+def restore_archived_payload(payload: str) -> dict:
+    """Dekomprimiert die `payload`-Spalte aus `sessions_archive`."""
+    return json.loads(zlib.decompress(base64.b64decode(payload)).decode("utf-8"))
+
+
+def cleanup_expired_sessions(
+    *, batch_size: int = 500, archive: bool = True, ttl_days: float | None = None, max_batches: int | None = None
+) -> int:
+    """Löscht abgelaufene Sessions in Blöcken von `batch_size` Zeilen (älteste zuerst).
+
+    Mit `archive=True` wird jede Zeile vorher komprimiert nach `sessions_archive`
+    kopiert; das Archivieren ist idempotent, ein abgebrochener Lauf kann also einfach
+    wiederholt werden. Zeilen, die zwischen Auslesen und Löschen neu gespeichert wurden,
+    bleiben erhalten (ihre Archivkopie wird beim späteren Ablauf überschrieben).
+    Liefert die Anzahl entfernter Sessions.
+    """
+    cutoff = _session_cutoff(ttl_days)
+    if cutoff is None:
+        raise RuntimeError(
+            "Session expiry is not configured or disabled. Set WICHTEL_SESSION_TTL_DAYS or pass a positive ttl_days."
+        )
+
+    columns = SESSION_COLUMNS if archive else "id,user_password_hash,admin_code_hash,created_at"
+    removed = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = _supabase_fetch_expired_batch(cutoff.isoformat(), batch_size, columns)
+        if not rows:
+            break
+        if archive:
+            archived_at = datetime.now(timezone.utc).isoformat()
+            _supabase_archive_sessions([_archive_row(row, archived_at) for row in rows])
+        deleted = set(_supabase_delete_sessions([row["id"] for row in rows], cutoff.isoformat()))
+        if SESSION_CACHE:
+            SESSION_CACHE.invalidate(
+                *(_cache_key("user_password_hash", row["user_password_hash"]) for row in rows if row["id"] in deleted)
+            )
+        removed += len(deleted)
+        batches += 1
+        if len(rows) < batch_size:
+            break
+    return removed
+
+
+def load_session_from_db(user_password: str):
+    hashed = hash_user_password(user_password)
+    entry = _load_session_entry("user_password_hash", hashed)
+    if not entry:
+        return None
+
+    return entry["data"]
+
+
+def load_session_from_admin_code(admin_code: str):
+    hashed = hash_admin_code(admin_code)
+    entry = _load_session_entry("admin_code_hash", hashed)
+    if not entry:
+        return None
+
+    data = entry["data"]
+    data["created_at"] = entry["created_at"]
+    return data
@@ -0,0 +1,128 @@
+"""Prozessübergreifender Cache für dekodierte Sessions.
+
+Mehrere Streamlit-Worker auf einem Host teilen sich ein Verzeichnis (idealerweise auf
+tmpfs, z. B. `/dev/shm/wichtel-cache`), in dem jede Session als JSON-Datei mit Ablaufzeit
+liegt. Schreiben erfolgt atomar über `os.replace`, daher sehen Leser nie halbe Einträge.
+
+`invalidate` hinterlässt einen Tombstone mit dem Invalidierungszeitpunkt. Werte, die vor
+diesem Zeitpunkt aus der Datenbank gelesen wurden (`fetched_at`), werden weder
+geschrieben noch ausgeliefert – so kann ein langsamer Leser einen gerade gespeicherten
+Stand nicht mit veralteten Daten überschreiben.
+
+Die Änderungszeit jeder Datei ist ihre Ablaufzeit; `purge_expired` kommt daher ohne
+Öffnen der Dateien aus und läuft nicht im Request-Pfad, sondern per Cron:
+
+    python session_cache.py /dev/shm/wichtel-cache
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+_SUFFIX = ".json"
+_TOMBSTONE_SUFFIX = ".tomb"
+_TMP_PREFIX = ".tmp-"
+
+
+class SharedSessionCache:
+    """Einfacher Key-Value-Cache mit TTL auf Dateibasis."""
+
+    def __init__(self, directory: str, ttl: float = 300):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    def _path(self, key: str, suffix: str = _SUFFIX) -> str:
+        if not key or os.sep in key or key.startswith("."):
+            raise ValueError(f"Invalid cache key: {key!r}")
+        return os.path.join(self.directory, key + suffix)
+
+    def _invalidated_at(self, key: str) -> float:
+        try:
+            with open(self._path(key, _TOMBSTONE_SUFFIX), encoding="utf-8") as fh:
+                return json.load(fh).get("invalidated_at", 0)
+        except (OSError, ValueError):
+            return 0
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as fh:
+                entry = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if entry.get("expires_at", 0) <= time.time():
+            self._remove(path)
+            return None
+        if entry.get("fetched_at", 0) <= self._invalidated_at(key):
+            return None
+        return entry.get("value")
+
+    def set(self, key: str, value, ttl: float | None = None, fetched_at: float | None = None) -> bool:
+        """Speichert `value`; `fetched_at` ist der Zeitpunkt, bevor die Daten gelesen wurden.
+
+        Liefert False (ohne zu schreiben), wenn der Schlüssel seit `fetched_at`
+        invalidiert wurde.
+        """
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        if fetched_at <= self._invalidated_at(key):
+            return False
+        expires_at = fetched_at + (self.ttl if ttl is None else ttl)
+        self._write(self._path(key), {"fetched_at": fetched_at, "expires_at": expires_at, "value": value}, expires_at)
+        return True
+
+    def invalidate(self, *keys: str) -> None:
+        now = time.time()
+        for key in keys:
+            # Erst den Tombstone schreiben, dann den Wert löschen: ein paralleles `set`
+            # mit älterem `fetched_at` wird so entweder übersprungen oder beim Lesen ignoriert.
+            # Eine TTL genügt als Lebensdauer: Werte laufen ab `fetched_at` gerechnet ab.
+            self._write(self._path(key, _TOMBSTONE_SUFFIX), {"invalidated_at": now}, now + self.ttl)
+            self._remove(self._path(key))
+
+    def purge_expired(self) -> int:
+        """Entfernt abgelaufene Einträge und Tombstones; liefert die Anzahl gelöschter Dateien."""
+        now = time.time()
+        removed = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    mtime = entry.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                if entry.name.startswith(_TMP_PREFIX):
+                    # Reste abgebrochener Schreibvorgänge
+                    expired = mtime + self.ttl <= now
+                elif entry.name.endswith((_SUFFIX, _TOMBSTONE_SUFFIX)):
+                    expired = mtime <= now
+                else:
+                    continue
+                if expired:
+                    self._remove(entry.path)
+                    removed += 1
+        return removed
+
+    def _write(self, path: str, data: dict, expires_at: float) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=_TMP_PREFIX)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(data, fh, ensure_ascii=False)
+            os.utime(tmp_path, (expires_at, expires_at))
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+if __name__ == "__main__":
+    for directory in sys.argv[1:]:
+        print(f"{directory}: {SharedSessionCache(directory).purge_expired()} Datei(en) entfernt")
@@ -13,3 +13,18 @@ create table if not exists public.sessions (
 
 create unique index if not exists idx_sessions_admin_code_hash
     on public.sessions (admin_code_hash);
+
+-- Supports session expiry checks and the batch cleanup job (oldest first).
+create index if not exists idx_sessions_created_at
+    on public.sessions (created_at);
+
+-- Cold storage for expired sessions; payload is base64(zlib(json)) of
+-- user_password, assignments_json and pairs_json.
+create table if not exists public.sessions_archive (
+    id bigint primary key,
+    user_password_hash text not null,
+    admin_code_hash text,
+    created_at timestamptz not null,
+    archived_at timestamptz not null,
+    payload text not null
+);
@@ -0,0 +1,181 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+import assignment  # noqa: E402
+
+
+def test_generate_group_assignments_keeps_input_order():
+    groups = [
+        ([f"Person{g}-{i}" for i in range(5 + g)], [], False)
+        for g in range(6)
+    ]
+    groups.append((["Anna", "Ben"], [("Anna", "Ben")], False))  # unlösbar
+
+    results = assignment.generate_group_assignments(groups, max_workers=2, chunksize=2)
+
+    assert len(results) == len(groups)
+    for (names, _, _), result in zip(groups[:-1], results[:-1]):
+        assert result["error"] is None
+        assert [giver for giver, _ in result["assignments"]] == names
+        assert sorted(receiver for _, receiver in result["assignments"]) == sorted(names)
+        assert all(giver != receiver for giver, receiver in result["assignments"])
+        assert set(result["codes"]) == set(names)
+
+    assert results[-1]["assignments"] is None
+    assert results[-1]["error"]
+
+
+def test_seeded_assignment_is_reproducible():
+    names = [f"Person{i}" for i in range(12)]
+    pairs = [("Person0", "Person1"), ("Person2", "Person3")]
+    seed = assignment.new_seed()
+
+    first = assignment.derive_seeded_assignments(seed, names, pairs)
+    second = assignment.derive_seeded_assignments(seed, list(names), [list(p) for p in pairs])
+
+    assert first == second
+    assert first != assignment.derive_seeded_assignments(assignment.new_seed(), names, pairs)
+    for item in first:
+        assert item["name"] != item["receiver"]
+        assert {item["name"], item["receiver"]} not in ({"Person0", "Person1"}, {"Person2", "Person3"})
+        assert assignment.find_seeded_receiver(seed, names, pairs, False, item["name"], item["code"]) == item["receiver"]
+
+
+def test_seed_algorithm_1_is_frozen():
+    # Erste Version des Seed-Modus: Paare über eine Name→Partner-Map, überlappende Paare
+    # überschreiben sich (Ben ↛ Carla, aber Ben → Anna erlaubt). Muss für alte Sessions so bleiben.
+    seed = bytes(32)
+    names = ["Anna", "Ben", "Carla", "Daniel"]
+    pairs = [("Anna", "Ben"), ("Ben", "Carla")]
+
+    v1 = assignment.derive_seeded_assignments(seed, names, pairs, algo=1)
+
+    assert [(item["name"], item["code"], item["receiver"]) for item in v1] == [
+        ("Anna", "973HCW", "Carla"),
+        ("Ben", "JW4Y8G", "Anna"),
+        ("Carla", "HJJ5T6", "Daniel"),
+        ("Daniel", "33UKHS", "Ben"),
+    ]
+    assert v1 != assignment.derive_seeded_assignments(seed, names, pairs)
+    assert assignment.find_seeded_receiver(seed, names, pairs, False, "Ben", "JW4Y8G", algo=1) == "Anna"
+    with pytest.raises(ValueError):
+        assignment.derive_seeded_assignments(seed, names, pairs, algo=99)
+
+
+def test_seed_algorithm_2_is_frozen():
+    # Gruppen (Anna in zwei Gruppen) und persönliche Ausschlüsse. Ändert sich dieses
+    # Ergebnis, braucht `generate_assignment` eine neue SEED_ALGORITHM-Version.
+    seed = bytes(range(32))
+    names = ["Anna", "Ben", "Carla", "Daniel", "Eva", "Frank", "Greta", "Hans"]
+    groups = [("Anna", "Ben"), ("Anna", "Carla"), ("Daniel", "Eva", "Frank")]
+    exclusions = {"Greta": ["Hans", "Anna"], "Ben": ["Daniel"]}
+
+    v2 = assignment.derive_seeded_assignments(seed, names, groups, exclusions=exclusions, algo=2)
+
+    assert [(item["name"], item["code"], item["receiver"]) for item in v2] == [
+        ("Anna", "9SGC3M", "Eva"),
+        ("Ben", "EZNDQG", "Hans"),
+        ("Carla", "3WQTEV", "Daniel"),
+        ("Daniel", "FCY6D3", "Greta"),
+        ("Eva", "DA9FMY", "Carla"),
+        ("Frank", "97XXDD", "Anna"),
+        ("Greta", "PK6KZS", "Ben"),
+        ("Hans", "SV7EKJ", "Frank"),
+    ]
+
+
+def test_seal_seed_round_trip_and_tamper_detection():
+    seed = assignment.new_seed()
+    sealed = assignment.seal_seed(seed, "server-key")
+
+    assert assignment.unseal_seed(sealed, "server-key") == seed
+    with pytest.raises(assignment.SeedKeyError):
+        assignment.unseal_seed(sealed, "other-key")
+    with pytest.raises(assignment.SeedKeyError):
+        assignment.unseal_seed(sealed[:-1], "server-key")
+
+
+def test_parse_constraints_groups_and_personal_exclusions():
+    names = ["Anna", "Ben", "Carla", "Daniel", "Eva"]
+    text = "anna, Ben, carla\nDaniel,Unbekannt\nEva: Anna, Ben\nEva: Ben, Daniel"
+
+    groups, exclusions = assignment.parse_constraints(text, names)
+
+    assert groups == [("Anna", "Ben", "Carla")]
+    assert exclusions == {"Eva": ["Anna", "Ben", "Daniel"]}
+    assert assignment.parse_pairs(text, names) == groups
+
+
+def test_parse_constraints_treats_labels_as_groups_and_reports_ignored_input():
+    names = ["Anna", "Ben", "Carla", "Daniel"]
+    text = "Familie Müller: Anna, Ben\nDaniel: Unbekannt\nCarla"
+    warnings = []
+
+    groups, exclusions = assignment.parse_constraints(text, names, warnings)
+
+    assert groups == [("Anna", "Ben")]
+    assert exclusions == {}
+    assert warnings == [
+        "„Familie Müller“ ist kein Teilnehmer – Zeile als Gruppe behandelt: Familie Müller: Anna, Ben",
+        "Zeile ignoriert (keine bekannten Namen nach dem Doppelpunkt): Daniel: Unbekannt",
+        "Zeile ignoriert (weniger als zwei bekannte Namen): Carla",
+        "Unbekannte Namen ignoriert: Unbekannt",
+    ]
+
+
+def test_parse_constraints_warns_about_misspelled_giver():
+    names = ["Anna", "Ben", "Frank"]
+    warnings = []
+
+    groups, exclusions = assignment.parse_constraints("Fran: Anna, Ben", names, warnings)
+
+    assert groups == [("Anna", "Ben")]
+    assert exclusions == {}
+    assert warnings == ["„Fran“ ist kein Teilnehmer – Zeile als Gruppe behandelt: Fran: Anna, Ben"]
+
+
+def test_generate_assignment_respects_all_groups_and_exclusions():
+    names = ["Anna", "Ben", "Carla", "Daniel", "Eva", "Frank"]
+    # Anna ist in zwei Gruppen; beide Ausschlüsse müssen gelten.
+    groups = [("Anna", "Ben"), ("Anna", "Carla"), ("Daniel", "Eva", "Frank")]
+    exclusions = {"Ben": ["Daniel"]}
+    forbidden = {("Anna", "Ben"), ("Ben", "Anna"), ("Anna", "Carla"), ("Carla", "Anna"), ("Ben", "Daniel")}
+    forbidden |= {(a, b) for a in groups[2] for b in groups[2]}
+
+    for _ in range(50):
+        result = assignment.generate_assignment(names, groups, exclusions=exclusions)
+        assert result is not None
+        assert not forbidden & set(result)
+        assert sorted(receiver for _, receiver in result) == sorted(names)
+
+    assert assignment.generate_assignment(["Anna", "Ben", "Carla"], [("Anna", "Ben", "Carla")]) is None
+
+
+class _KillsWorker:
+    """Beendet den Worker-Prozess beim Entpacken (simuliert z. B. einen OOM-Kill)."""
+
+    def __reduce__(self):
+        import os
+
+        return (os._exit, (1,))
+
+
+def test_group_assignments_report_broken_worker_as_error():
+    groups = [([f"Person{g}-{i}" for i in range(4)], [], False) for g in range(12)]
+    groups.insert(5, (_KillsWorker(), [], False))
+
+    results = assignment.generate_group_assignments(groups, max_workers=4, chunksize=1)
+
+    assert len(results) == len(groups)
+    assert results[5]["assignments"] is None
+    assert "BrokenProcessPool" in results[5]["error"]
+    for index, result in enumerate(results):
+        if index != 5:
+            assert result["error"] is None
+            assert len(result["assignments"]) == 4
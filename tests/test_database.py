@@ -1,20 +1,31 @@
 import importlib
-import itertools
+import json
 import sys
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from urllib.parse import urlsplit
 
 import pytest
 import requests
 
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+import assignment  # noqa: E402
+from tools.fake_supabase import SessionStore  # noqa: E402
+
+
+@pytest.fixture
+def store():
+    return SessionStore()
+
 
 @pytest.fixture
-def app_module(monkeypatch):
+def db(monkeypatch, store):
     monkeypatch.setenv("SUPABASE_URL", "https://example.test")
     monkeypatch.setenv("SUPABASE_SERVICE_ROLE_KEY", "test-key")
-
-    store: dict[str, dict[str, str]] = {}
-    id_counter = itertools.count(1)
+    monkeypatch.setenv("WICHTEL_SEED_KEY", "test-seed-key")
 
     class FakeResponse:
         def __init__(self, status_code=200, data=None, headers=None, text=""):
@@ -26,55 +37,33 @@ def app_module(monkeypatch):
         def json(self):
             return self._data
 
+    def _handle(method, url, params=None, payload=None):
+        status, data = store.handle(method, urlsplit(url).path, params, payload)
+        if status == 404:
+            raise AssertionError(f"Unexpected {method} URL {url}")
+        return FakeResponse(status_code=status, data=data, text=str(data))
+
     def fake_post(url, *, headers=None, json=None, params=None, timeout=None):  # type: ignore[override]
-        if url.endswith("/rest/v1/rpc/sql"):
-            return FakeResponse()
-        if url.endswith("/rest/v1/sessions"):
-            if not json:
-                raise AssertionError("Expected payload for upsert")
-            record = json[0].copy()
-            key = record["user_password_hash"]
-            existing = store.get(key)
-            if existing:
-                record["id"] = existing["id"]
-            else:
-                record["id"] = next(id_counter)
-            store[key] = record
-            return FakeResponse(status_code=201)
-        raise AssertionError(f"Unexpected POST URL {url}")
+        return _handle("POST", url, params, json)
 
     def fake_get(url, *, headers=None, params=None, timeout=None):  # type: ignore[override]
-        if url.endswith("/rest/v1/sessions"):
-            data = []
-            if params:
-                filter_fields = [k for k in params.keys() if k not in {"select", "limit"}]
-                if filter_fields:
-                    field = filter_fields[0]
-                    filter_value = params[field]
-                    if isinstance(filter_value, str) and filter_value.startswith("eq."):
-                        target = filter_value[3:]
-                        for record in store.values():
-                            if record.get(field) == target:
-                                data = [record]
-                                break
-            return FakeResponse(data=data)
-        raise AssertionError(f"Unexpected GET URL {url}")
+        return _handle("GET", url, params)
+
+    def fake_delete(url, *, headers=None, params=None, timeout=None):  # type: ignore[override]
+        return _handle("DELETE", url, params)
 
     monkeypatch.setattr(requests, "post", fake_post)
     monkeypatch.setattr(requests, "get", fake_get)
+    monkeypatch.setattr(requests, "delete", fake_delete)
 
-    repo_root = Path(__file__).resolve().parents[1]
-    if str(repo_root) not in sys.path:
-        sys.path.insert(0, str(repo_root))
+    if "database" in sys.modules:
+        del sys.modules["database"]
 
-    if "wichtel" in sys.modules:
-        del sys.modules["wichtel"]
-
-    module = importlib.import_module("wichtel")
+    module = importlib.import_module("database")
     return module
 
 
-def test_save_and_load_round_trip(app_module):
+def test_save_and_load_round_trip(db):
     assignments = [
         {"name": "Anna", "code": "ABC123", "receiver": "Ben"},
         {"name": "Ben", "code": "XYZ789", "receiver": "Anna"},
@@ -82,15 +71,15 @@ def test_save_and_load_round_trip(app_module):
     pairs = [["Anna", "Ben"]]
     admin_code = "SESSIONCODE1"
 
-    app_module.save_session_to_db("Stern123", admin_code, assignments, pairs)
+    db.save_session_to_db("Stern123", admin_code, assignments, pairs)
 
-    loaded = app_module.load_session_from_db("Stern123")
+    loaded = db.load_session_from_db("Stern123")
     assert loaded is not None
     assert loaded["assignments"] == assignments
     assert loaded["pairs"] == pairs
     assert loaded["user_password"] == "Stern123"
 
-    admin_view = app_module.load_session_from_admin_code(admin_code)
+    admin_view = db.load_session_from_admin_code(admin_code)
     assert admin_view is not None
     assert admin_view["assignments"] == assignments
     assert admin_view["pairs"] == pairs
@@ -98,10 +87,249 @@ def test_save_and_load_round_trip(app_module):
     datetime.fromisoformat(admin_view["created_at"])
 
 
-def test_invalid_admin_code(app_module):
+def test_invalid_admin_code(db):
     assignments = [{"name": "Carla", "code": "QWE456", "receiver": "Daniel"}]
     pairs = []
 
-    app_module.save_session_to_db("Mond987", "SESSIONCODE2", assignments, pairs)
+    db.save_session_to_db("Mond987", "SESSIONCODE2", assignments, pairs)
+
+    assert db.load_session_from_admin_code("WRONGCODE") is None
+
+
+def test_seeded_session_round_trip(db):
+    names = ["Anna", "Ben", "Carla", "Daniel"]
+    pairs = [["Anna", "Ben"]]
+    seed = assignment.new_seed()
+    expected = assignment.derive_seeded_assignments(seed, names, pairs)
+
+    db.save_seeded_session_to_db("Kerze321", "SESSIONCODE3", names, pairs, seed)
+
+    loaded = db.load_session_from_db("Kerze321")
+    assert "assignments" not in loaded
+    assert loaded["roster"] == names
+    assert db.session_seed(loaded) == seed
+    for item in expected:
+        assert db.lookup_receiver(loaded, item["name"].lower(), item["code"]) == item["receiver"]
+    assert db.lookup_receiver(loaded, "Anna", "WRONG1") is None
+
+    admin_view = db.load_session_from_admin_code("SESSIONCODE3")
+    assert db.session_assignments(admin_view) == expected
+
+
+def test_seeded_session_without_algo_uses_first_solver(db, store):
+    names = ["Anna", "Ben", "Carla", "Daniel"]
+    pairs = [["Anna", "Ben"], ["Ben", "Carla"]]
+    seed = bytes(32)
+    db.save_seeded_session_to_db("Kerze111", "SESSIONCODE10", names, pairs, seed)
+
+    record = store.records[db.hash_user_password("Kerze111")]
+    stored = json.loads(record["assignments_json"])
+    assert stored["algo"] == assignment.SEED_ALGORITHM
+    del stored["algo"]
+    record["assignments_json"] = json.dumps(stored)
+
+    loaded = db.load_session_from_db("Kerze111")
+    expected = assignment.derive_seeded_assignments(seed, names, pairs, algo=1)
+    assert loaded["algo"] == 1
+    assert db.session_assignments(loaded) == expected
+    assert db.lookup_receiver(loaded, "Ben", expected[1]["code"]) == "Anna"
+
+    # Erneutes Speichern (z. B. über "Session in Formular laden") behält die Version.
+    db.save_seeded_session_to_db(
+        "Kerze111", "SESSIONCODE10", names, pairs, db.session_seed(loaded), algo=loaded["algo"]
+    )
+    reloaded = db.load_session_from_db("Kerze111")
+    assert reloaded["algo"] == 1
+    assert db.session_assignments(reloaded) == expected
+
+
+def test_seeded_sessions_require_matching_seed_key(db, monkeypatch):
+    names = ["Anna", "Ben", "Carla"]
+    db.save_seeded_session_to_db("Kerze654", "SESSIONCODE8", names, [], assignment.new_seed())
+    loaded = db.load_session_from_db("Kerze654")
+
+    # Andere ValueErrors (z. B. unbekannte Solver-Version) sind kein Schlüsselproblem.
+    with pytest.raises(ValueError) as excinfo:
+        db.session_assignments({**loaded, "algo": 99})
+    assert not isinstance(excinfo.value, assignment.SeedKeyError)
+
+    monkeypatch.setattr(db, "SEED_SEAL_KEY", "rotated-key")
+    with pytest.raises(assignment.SeedKeyError):
+        db.lookup_receiver(loaded, "Anna", "ABC123")
+
+    monkeypatch.setattr(db, "SEED_SEAL_KEY", None)
+    with pytest.raises(assignment.SeedKeyError):
+        db.session_assignments(loaded)
+    with pytest.raises(RuntimeError):
+        db.save_seeded_session_to_db("Kerze987", "SESSIONCODE9", names, [], assignment.new_seed())
+    assert db.session_participants(loaded) == names
+
+
+def test_shared_cache_serves_loads_and_is_invalidated_on_save(db, monkeypatch, tmp_path):
+    db.SESSION_CACHE = db.SharedSessionCache(str(tmp_path), ttl=60)
+    assignments = [{"name": "Eva", "code": "EVA111", "receiver": "Frank"}]
+    db.save_session_to_db("Wolke555", "SESSIONCODE4", assignments, [])
+
+    assert db.load_session_from_db("Wolke555")["assignments"] == assignments
+
+    get_calls = []
+    original_get = requests.get
+
+    def counting_get(*args, **kwargs):
+        get_calls.append(args)
+        return original_get(*args, **kwargs)
+
+    monkeypatch.setattr(requests, "get", counting_get)
+    assert db.load_session_from_db("Wolke555")["assignments"] == assignments
+    admin_view = db.load_session_from_admin_code("SESSIONCODE4")
+    assert admin_view["assignments"] == assignments
+    assert admin_view["created_at"]
+    assert get_calls == []
+
+    updated = [{"name": "Eva", "code": "EVA222", "receiver": "Frank"}]
+    db.save_session_to_db("Wolke555", "SESSIONCODE5", updated, [])
+    assert db.load_session_from_db("Wolke555")["assignments"] == updated
+    assert db.load_session_from_admin_code("SESSIONCODE4") is None
+    assert db.load_session_from_admin_code("SESSIONCODE5")["assignments"] == updated
+
+
+def test_shared_cache_skips_rows_read_before_a_concurrent_save(db, monkeypatch, tmp_path):
+    db.SESSION_CACHE = db.SharedSessionCache(str(tmp_path), ttl=60)
+    old = [{"name": "Eva", "code": "EVA111", "receiver": "Frank"}]
+    new = [{"name": "Eva", "code": "EVA333", "receiver": "Frank"}]
+    db.save_session_to_db("Wolke666", "SESSIONCODE11", old, [])
+
+    original_fetch = db._supabase_fetch_single
+
+    def fetch_then_save(*args, **kwargs):
+        record = original_fetch(*args, **kwargs)
+        # Ein anderer Worker speichert, nachdem dieser Leser die alte Zeile gelesen hat.
+        db.save_session_to_db("Wolke666", "SESSIONCODE11", new, [])
+        return record
+
+    monkeypatch.setattr(db, "_supabase_fetch_single", fetch_then_save)
+    assert db.load_session_from_db("Wolke666")["assignments"] == old
+    monkeypatch.setattr(db, "_supabase_fetch_single", original_fetch)
+
+    assert db.load_session_from_db("Wolke666")["assignments"] == new
+
+
+def test_exclusions_round_trip(db):
+    assignments = [
+        {"name": "Anna", "code": "AAA111", "receiver": "Carla"},
+        {"name": "Ben", "code": "BBB222", "receiver": "Anna"},
+        {"name": "Carla", "code": "CCC333", "receiver": "Ben"},
+    ]
+    pairs = [["Anna", "Ben"]]
+    exclusions = {"Carla": ["Anna"]}
+
+    db.save_session_to_db("Baum777", "SESSIONCODE6", assignments, pairs, exclusions)
+
+    loaded = db.load_session_from_db("Baum777")
+    assert loaded["assignments"] == assignments
+    assert loaded["pairs"] == pairs
+    assert loaded["exclusions"] == exclusions
+
+
+def _age_session(store, user_password, db, days):
+    record = store.records[db.hash_user_password(user_password)]
+    record["created_at"] = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+
+
+def test_expired_session_is_reported_without_payload(db, monkeypatch, store):
+    assignments = [{"name": "Anna", "code": "ABC123", "receiver": "Ben"}]
+    db.save_session_to_db("Alt111", "SESSIONCODE7", assignments, [])
+    _age_session(store, "Alt111", db, days=400)
+    monkeypatch.setattr(db, "SESSION_TTL_DAYS", 365)
+
+    selects = []
+    original_get = requests.get
+
+    def recording_get(url, *, headers=None, params=None, timeout=None):
+        selects.append(params["select"])
+        return original_get(url, headers=headers, params=params, timeout=timeout)
+
+    monkeypatch.setattr(requests, "get", recording_get)
+
+    with pytest.raises(db.SessionExpiredError) as excinfo:
+        db.load_session_from_db("Alt111")
+    assert excinfo.value.created_at == store.records[db.hash_user_password("Alt111")]["created_at"]
+    with pytest.raises(db.SessionExpiredError):
+        db.load_session_from_admin_code("SESSIONCODE7")
+    assert selects[1] == "id,created_at"
+    assert db.load_session_from_db("Unbekannt000") is None
+
+
+def test_cleanup_archives_expired_sessions_in_batches(db, monkeypatch, store):
+    assignments = [{"name": "Anna", "code": "ABC123", "receiver": "Ben"}]
+    for i in range(5):
+        db.save_session_to_db(f"Alt{i}", f"ADMINALT{i}", assignments, [["Anna", "Ben"]])
+        _age_session(store, f"Alt{i}", db, days=400 + i)
+    db.save_session_to_db("Neu1", "ADMINNEU1", assignments, [])
+    monkeypatch.setattr(db, "SESSION_TTL_DAYS", 365)
+
+    assert db.cleanup_expired_sessions(batch_size=2, max_batches=1) == 2
+    assert db.cleanup_expired_sessions(batch_size=2) == 3
+
+    assert [record["user_password"] for record in store.records.values()] == ["Neu1"]
+    assert len(store.archive) == 5
+    restored = db.restore_archived_payload(next(iter(store.archive.values()))["payload"])
+    assert json.loads(restored["assignments_json"]) == assignments
+    assert restored["user_password"].startswith("Alt")
+
+
+def test_cleanup_keeps_sessions_saved_between_fetch_and_delete(db, monkeypatch, store):
+    old = [{"name": "Anna", "code": "ABC123", "receiver": "Ben"}]
+    new = [{"name": "Anna", "code": "NEU456", "receiver": "Ben"}]
+    for password in ("Alt7", "Alt8"):
+        db.save_session_to_db(password, f"ADMIN{password}", old, [])
+        _age_session(store, password, db, days=400)
+    monkeypatch.setattr(db, "SESSION_TTL_DAYS", 365)
+
+    original_fetch = db._supabase_fetch_expired_batch
+
+    def fetch_then_resave(*args, **kwargs):
+        rows = original_fetch(*args, **kwargs)
+        if rows:
+            db.save_session_to_db("Alt8", "ADMINAlt8", new, [])
+        return rows
+
+    monkeypatch.setattr(db, "_supabase_fetch_expired_batch", fetch_then_resave)
+
+    assert db.cleanup_expired_sessions(batch_size=10) == 1
+    assert [record["user_password"] for record in store.records.values()] == ["Alt8"]
+    assert db.load_session_from_db("Alt8")["assignments"] == new
+
+    # Läuft die Session später ab, ersetzt die neue Archivkopie die alte.
+    monkeypatch.setattr(db, "_supabase_fetch_expired_batch", original_fetch)
+    _age_session(store, "Alt8", db, days=400)
+    assert db.cleanup_expired_sessions(batch_size=10) == 1
+    archived = [db.restore_archived_payload(row["payload"]) for row in store.archive.values()]
+    assert [json.loads(row["assignments_json"]) for row in archived if row["user_password"] == "Alt8"] == [new]
+
+
+def test_cleanup_rejects_delete_without_returned_rows(db, monkeypatch, store):
+    db.save_session_to_db("Alt9", "ADMINALT9", [{"name": "Anna", "code": "ABC123", "receiver": "Ben"}], [])
+    _age_session(store, "Alt9", db, days=400)
+
+    class NoContent:
+        status_code = 204
+        text = ""
+
+        def json(self):
+            raise ValueError("No content")
+
+    monkeypatch.setattr(requests, "delete", lambda url, **kwargs: NoContent())
+
+    with pytest.raises(RuntimeError, match="204"):
+        db.cleanup_expired_sessions(ttl_days=365)
+
+
+def test_cleanup_with_zero_ttl_does_not_fall_back_to_configured_expiry(db, monkeypatch, store):
+    db.save_session_to_db("Alt10", "ADMINALT10", [{"name": "Anna", "code": "ABC123", "receiver": "Ben"}], [])
+    _age_session(store, "Alt10", db, days=400)
+    monkeypatch.setattr(db, "SESSION_TTL_DAYS", 365)
 
-    assert app_module.load_session_from_admin_code("WRONGCODE") is None
+    with pytest.raises(RuntimeError, match="disabled"):
+        db.cleanup_expired_sessions(ttl_days=0)
+    assert len(store.records) == 1
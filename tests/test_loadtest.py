@@ -0,0 +1,72 @@
+import importlib
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+from tools import loadtest  # noqa: E402
+from tools.fake_supabase import FakeSupabaseServer  # noqa: E402
+
+
+@pytest.fixture
+def fake_server():
+    with FakeSupabaseServer() as server:
+        yield server
+
+
+@pytest.fixture
+def db(monkeypatch, fake_server):
+    monkeypatch.setenv("SUPABASE_URL", fake_server.url)
+    monkeypatch.setenv("SUPABASE_SERVICE_ROLE_KEY", "test-key")
+    if "database" in sys.modules:
+        del sys.modules["database"]
+    yield importlib.import_module("database")
+    del sys.modules["database"]
+
+
+def test_fake_server_round_trip(db, fake_server):
+    assignments = [
+        {"name": "Anna", "code": "ABC123", "receiver": "Ben"},
+        {"name": "Ben", "code": "XYZ789", "receiver": "Anna"},
+    ]
+    db.save_session_to_db("Stern123", "SESSIONCODE1", assignments, [["Anna", "Ben"]])
+
+    assert len(fake_server.store) == 1
+    loaded = db.load_session_from_db("Stern123")
+    assert loaded["assignments"] == assignments
+    assert db.find_receiver(loaded["assignments"], "anna", "ABC123") == "Ben"
+    assert db.load_session_from_admin_code("WRONGCODE") is None
+
+
+def test_run_scenario_reports_latencies(db):
+    round_data = loadtest.seed_round(db, 20, random.Random(0))
+
+    stats = loadtest.run_scenario(db, round_data, concurrency=4, iterations=5, admin_share=0.5)
+
+    assert stats["total"] == 20
+    assert stats["participant"]["count"] + stats["admin"]["count"] == 20
+    assert stats["participant"]["error_rate"] == 0.0
+    assert stats["admin"]["error_rate"] == 0.0
+    assert stats["participant"]["p50"] <= stats["participant"]["p99"]
+    assert "Runde" in loadtest.format_report([stats])
+
+
+def test_app_flows_drive_the_real_script(db):
+    from streamlit.testing.v1 import AppTest
+
+    round_data = loadtest.seed_round(db, 5, random.Random(1))
+    rng = random.Random(0)
+
+    at = AppTest.from_file(str(loadtest.APP_PATH), default_timeout=60)
+    assert loadtest._app_participant_flow(at, round_data, rng)
+    at = AppTest.from_file(str(loadtest.APP_PATH), default_timeout=60)
+    assert loadtest._app_admin_flow(at, round_data, rng)
+
+    wrong = dict(round_data, assignments=[dict(item, code="FALSCH") for item in round_data["assignments"]])
+    at = AppTest.from_file(str(loadtest.APP_PATH), default_timeout=60)
+    assert not loadtest._app_participant_flow(at, wrong, rng)
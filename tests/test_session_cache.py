@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+from session_cache import SharedSessionCache  # noqa: E402
+
+
+def test_set_get_invalidate(tmp_path):
+    cache = SharedSessionCache(str(tmp_path), ttl=60)
+    other_process = SharedSessionCache(str(tmp_path), ttl=60)
+
+    cache.set("user-abc", {"assignments": [{"name": "Anna"}]})
+
+    assert other_process.get("user-abc") == {"assignments": [{"name": "Anna"}]}
+    other_process.invalidate("user-abc", "missing")
+    assert cache.get("user-abc") is None
+
+
+def test_expired_entries_are_ignored_and_purged(tmp_path):
+    cache = SharedSessionCache(str(tmp_path), ttl=60)
+    cache.set("old", {"x": 1}, ttl=-1)
+    cache.set("fresh", {"x": 2})
+
+    assert cache.get("old") is None
+    cache.set("old-again", {"x": 3}, ttl=-1)
+    cache.invalidate("gone")
+    tombstone = tmp_path / "gone.tomb"
+    os.utime(tombstone, (time.time() - 1, time.time() - 1))
+    assert cache.purge_expired() == 2
+    assert cache.get("fresh") == {"x": 2}
+    assert not tombstone.exists()
+
+
+def test_values_fetched_before_invalidation_are_not_cached(tmp_path, monkeypatch):
+    cache = SharedSessionCache(str(tmp_path), ttl=60)
+    other_process = SharedSessionCache(str(tmp_path), ttl=60)
+
+    fetched_at = time.time()
+    other_process.invalidate("user-abc")  # Speichern in einem anderen Worker während des Lesens
+    assert cache.set("user-abc", {"stand": "alt"}, fetched_at=fetched_at) is False
+    assert cache.get("user-abc") is None
+
+    # `set` hat den Tombstone noch nicht gesehen, schreibt aber erst nach `invalidate`.
+    monkeypatch.setattr(cache, "_invalidated_at", lambda key: 0)
+    assert cache.set("user-abc", {"stand": "alt"}, fetched_at=fetched_at) is True
+    assert other_process.get("user-abc") is None
+
+    assert other_process.set("user-abc", {"stand": "neu"}) is True
+    assert other_process.get("user-abc") == {"stand": "neu"}
@@ -0,0 +1,43 @@
+"""Batch-Job: abgelaufene Sessions archivieren und aus `sessions` löschen.
+
+Nutzt dieselben Zugangsdaten wie die App (SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+und die Ablaufzeit aus WICHTEL_SESSION_TTL_DAYS, z. B. als täglicher Cron-Job. Ist
+WICHTEL_SHARED_CACHE_DIR gesetzt, wird zusätzlich der lokale Session-Cache aufgeräumt:
+
+    WICHTEL_SESSION_TTL_DAYS=180 python tools/cleanup_sessions.py --batch-size 500
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+import database  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Abgelaufene Wichtel-Sessions archivieren und löschen.")
+    parser.add_argument("--batch-size", type=int, default=500, help="Zeilen pro Block")
+    parser.add_argument("--max-batches", type=int, help="Höchstens so viele Blöcke pro Lauf")
+    parser.add_argument("--ttl-days", type=float, help="Überschreibt WICHTEL_SESSION_TTL_DAYS (0 = kein Ablauf)")
+    parser.add_argument("--no-archive", action="store_true", help="Ohne Archivkopie löschen")
+    args = parser.parse_args(argv)
+
+    removed = database.cleanup_expired_sessions(
+        batch_size=args.batch_size,
+        archive=not args.no_archive,
+        ttl_days=args.ttl_days,
+        max_batches=args.max_batches,
+    )
+    print(f"{removed} abgelaufene Session(s) {'gelöscht' if args.no_archive else 'archiviert und gelöscht'}.")
+    if database.SESSION_CACHE:
+        purged = database.SESSION_CACHE.purge_expired()
+        print(f"{purged} abgelaufene Cache-Datei(en) entfernt.")
+    return removed
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""Lokaler Fake-Supabase für Tests und Lasttests.
+
+`SessionStore` ist die einzige In-Memory-Nachbildung der Tabellen `sessions` und
+`sessions_archive`: `tests/test_database.py` leitet die gepatchten `requests`-Aufrufe
+direkt an `SessionStore.handle` weiter, `FakeSupabaseServer` stellt denselben Store als
+echten HTTP-Server bereit. Unterstützt wird nur der Ausschnitt der PostgREST-API, den
+die App nutzt.
+
+Standalone starten (z. B. für Lasttests gegen einen separaten Prozess):
+
+    python tools/fake_supabase.py --port 54321
+"""
+
+import argparse
+import itertools
+import json
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+class SessionStore:
+    """Thread-sichere In-Memory-Tabelle `sessions`, Upsert über `user_password_hash`."""
+
+    def __init__(self):
+        # Zeilen von `sessions` nach `user_password_hash`, von `sessions_archive` nach `id`.
+        self.records: dict[str, dict] = {}
+        self.archive: dict[int, dict] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def handle(self, method: str, path: str, params: dict | None = None, payload=None) -> tuple[int, object]:
+        """Beantwortet einen PostgREST-Aufruf; liefert `(status, json_body)`."""
+        params = params or {}
+        try:
+            if path == "/rest/v1/rpc/sql" and method == "POST":
+                return 200, []
+            if path == "/rest/v1/sessions_archive" and method == "POST":
+                self.archive_rows(payload or [])
+                return 201, None
+            if path != "/rest/v1/sessions":
+                return 404, {"message": f"Unknown path {path}"}
+            if method == "GET":
+                return 200, self.select(params)
+            if method == "POST":
+                if not payload:
+                    return 400, {"message": "Expected payload for upsert"}
+                for record in payload:
+                    self.upsert(record)
+                return 201, None
+            if method == "DELETE":
+                if not params:
+                    return 400, {"message": "DELETE requires a filter"}
+                # Wie PostgREST mit `Prefer: return=representation`
+                return 200, _project(self.delete(params), params)
+        except ValueError as exc:
+            return 400, {"message": str(exc)}
+        return 405, {"message": f"Unsupported method {method}"}
+
+    def upsert(self, record: dict) -> None:
+        record = record.copy()
+        key = record["user_password_hash"]
+        with self._lock:
+            existing = self.records.get(key)
+            record["id"] = existing["id"] if existing else next(self._ids)
+            self.records[key] = record
+
+    def _filtered(self, params: dict[str, str]) -> list[dict]:
+        filters = _filters(params)
+        with self._lock:
+            records = list(self.records.values())
+        return [
+            record for record in records
+            if all(_matches(record.get(field), condition) for field, condition in filters.items())
+        ]
+
+    def select(self, params: dict[str, str]) -> list[dict]:
+        limit = int(params["limit"]) if "limit" in params else None
+
+        records = self._filtered(params)
+        if "order" in params:
+            field, _, direction = params["order"].partition(".")
+            records.sort(key=lambda r: _comparable(r.get(field)), reverse=direction == "desc")
+        if limit is not None:
+            records = records[:limit]
+        return _project(records, params)
+
+    def delete(self, params: dict[str, str]) -> list[dict]:
+        """Löscht alle passenden Zeilen und liefert sie zurück."""
+        removed = []
+        with self._lock:
+            for record in list(self.records.values()):
+                if all(_matches(record.get(field), condition) for field, condition in _filters(params).items()):
+                    removed.append(self.records.pop(record["user_password_hash"]))
+        return removed
+
+    def archive_rows(self, rows: list[dict]) -> None:
+        """Upsert über `id` (`resolution=merge-duplicates`)."""
+        with self._lock:
+            for row in rows:
+                self.archive[row["id"]] = row.copy()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self.records)
+
+
+def _filters(params: dict[str, str]) -> dict[str, str]:
+    return {k: v for k, v in params.items() if k not in {"select", "limit", "order", "on_conflict"}}
+
+
+def _project(records: list[dict], params: dict[str, str]) -> list[dict]:
+    columns = [c for c in params.get("select", "").split(",") if c]
+    return [{c: record.get(c) for c in columns} if columns else record.copy() for record in records]
+
+
+def _comparable(value):
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _matches(value, condition: str) -> bool:
+    op, _, target = condition.partition(".")
+    if value is None:
+        return False
+    if op == "eq":
+        return str(value) == target
+    if op == "in":
+        return str(value) in target.strip("()").split(",")
+    if op in ("lt", "gte"):
+        left, right = _comparable(value), _comparable(target)
+        return left < right if op == "lt" else left >= right
+    raise ValueError(f"Unsupported filter operator: {op}")
+
+
+def _make_handler(store: SessionStore):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):  # noqa: A002 - signature from BaseHTTPRequestHandler
+            pass
+
+        def _send(self, status: int, data=None) -> None:
+            body = json.dumps(data).encode("utf-8") if data is not None else b""
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"null")
+
+        def _dispatch(self, method: str) -> None:
+            url = urlsplit(self.path)
+            payload = self._read_json() if method == "POST" else None
+            status, data = store.handle(method, url.path, dict(parse_qsl(url.query)), payload)
+            self._send(status, data)
+
+        def do_GET(self):
+            self._dispatch("GET")
+
+        def do_POST(self):
+            self._dispatch("POST")
+
+        def do_DELETE(self):
+            self._dispatch("DELETE")
+
+    return Handler
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class FakeSupabaseServer:
+    """Startet den Fake-Server in einem Hintergrund-Thread (`with`-Block oder start/stop)."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, store: SessionStore | None = None):
+        self.store = store or SessionStore()
+        self._httpd = _Server((host, port), _make_handler(self.store))
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeSupabaseServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    args = parser.parse_args()
+
+    server = FakeSupabaseServer(args.host, args.port)
+    print(f"Fake-Supabase läuft unter {server.url}", flush=True)
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""Lasttest für den Teilnehmer- und Admin-Ablauf von `wichtel.py`.
+
+Startet (falls keine `--url` angegeben ist) `tools/fake_supabase.py` als eigenen Prozess,
+legt pro Rundengröße eine Session an und lässt anschließend viele virtuelle Nutzer parallel
+den Ablauf durchlaufen:
+
+* Teilnehmer: Runde per User-Passwort laden, dann Empfänger über Name + Code suchen
+* Admin: Session über den Session-Admin-Code öffnen
+
+Zwei Modi:
+
+* `--mode storage` (Default): ruft die Lade- und Suchfunktionen aus `database.py` direkt in
+  Threads auf. Gemessen wird nur der Speicher- und Suchpfad (HTTP zu Supabase, Dekodieren,
+  Cache, Empfängersuche) – kein Streamlit.
+* `--mode app`: jeder virtuelle Nutzer ist ein eigener Prozess, der das echte Skript über
+  `streamlit.testing.v1.AppTest` bedient (Buttons klicken, Eingaben setzen). Gemessen werden
+  damit auch die kompletten Skript-Reruns, Session-State und Fragmente.
+
+Beide Modi umgehen Streamlits Tornado-/Websocket-Server und laufen nicht im Container;
+Verbindungslimits, Websocket-Overhead und CPU-/Speicherlimits des Deployments sind damit
+nicht abgedeckt. Dafür muss ein Websocket-Client gegen eine laufende Instanz gerichtet werden.
+
+Ausgegeben werden Durchsatz, Latenz-Perzentile und Fehlerquoten je Kombination aus
+Rundengröße und Parallelität.
+
+    python tools/loadtest.py --round-sizes 10,100,1000 --concurrency 1,8,32 --iterations 50
+    python tools/loadtest.py --mode app --round-sizes 10,100 --concurrency 1,4 --iterations 5
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+import assignment  # noqa: E402
+
+APP_PATH = REPO_ROOT / "wichtel.py"
+
+
+def _configure(url: str, key: str) -> None:
+    os.environ["SUPABASE_URL"] = url
+    os.environ["SUPABASE_SERVICE_ROLE_KEY"] = key
+    os.environ.setdefault("WICHTEL_SEED_KEY", "loadtest-seed-key")  # für --seeded
+
+
+def _import_database(url: str, key: str):
+    _configure(url, key)
+    import database
+
+    return database
+
+
+def start_fake_server() -> tuple[subprocess.Popen, str]:
+    """Startet `tools/fake_supabase.py` als eigenen Prozess und liefert `(prozess, url)`."""
+    process = subprocess.Popen(
+        [sys.executable, str(REPO_ROOT / "tools" / "fake_supabase.py"), "--port", "0"],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    line = process.stdout.readline()
+    if not line:
+        process.kill()
+        raise RuntimeError("Fake-Supabase-Server konnte nicht gestartet werden")
+    return process, line.rsplit(" ", 1)[-1].strip()
+
+
+def seed_round(db, size: int, rng: random.Random, seeded: bool = False) -> dict:
+    """Legt eine Runde mit `size` Teilnehmern an und gibt die Zugangsdaten zurück."""
+    names = [f"Teilnehmer{i:05d}" for i in range(size)]
+    allow_self = size == 1
+    user_password = f"Last{size}-{rng.randrange(10**9)}"
+    admin_code = assignment.generate_session_code()
+    if seeded:
+        seed = assignment.new_seed()
+        assignments = assignment.derive_seeded_assignments(seed, names, [], allow_self)
+        db.save_seeded_session_to_db(user_password, admin_code, names, [], seed, allow_self)
+    else:
+        result = assignment.generate_assignment(names, [], allow_self)
+        assignments = result and [
+            {"name": giver, "code": assignment.generate_code(), "receiver": receiver}
+            for giver, receiver in result
+        ]
+        if assignments:
+            db.save_session_to_db(user_password, admin_code, assignments, [])
+    if not assignments:
+        raise RuntimeError(f"Konnte keine Zuteilung für {size} Teilnehmer erzeugen")
+    return {"user_password": user_password, "admin_code": admin_code, "assignments": assignments}
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _participant_flow(db, round_data: dict, rng: random.Random) -> bool:
+    item = rng.choice(round_data["assignments"])
+    loaded = db.load_session_from_db(round_data["user_password"])
+    if not loaded:
+        return False
+    return db.lookup_receiver(loaded, item["name"], item["code"]) == item["receiver"]
+
+
+def _admin_flow(db, round_data: dict, rng: random.Random) -> bool:
+    loaded = db.load_session_from_admin_code(round_data["admin_code"])
+    return bool(loaded) and len(db.session_assignments(loaded)) == len(round_data["assignments"])
+
+
+def _button(at, label: str):
+    return next(button for button in at.button if label in button.label)
+
+
+def _app_participant_flow(at, round_data: dict, rng: random.Random) -> bool:
+    item = rng.choice(round_data["assignments"])
+    at.run()
+    at.text_input(key="user_password_input").input(round_data["user_password"])
+    _button(at, "Laden").click().run()
+    at.text_input(key="user_name").input(item["name"])
+    at.text_input(key="user_code").input(item["code"])
+    _button(at, "Empfänger anzeigen").click().run()
+    return not at.exception and any(item["receiver"] in md.value for md in at.markdown)
+
+
+def _app_admin_flow(at, round_data: dict, rng: random.Random) -> bool:
+    at.run()
+    at.radio(key="mode_select").set_value("🛠️ Session-Admin").run()
+    next(box for box in at.text_input if box.label.startswith("Session-Admin-Code")).input(round_data["admin_code"])
+    _button(at, "Session öffnen").click().run()
+    expected = f"Teilnehmer: {len(round_data['assignments'])}"
+    return not at.exception and any(expected in box.value for box in at.success)
+
+
+def _virtual_user(db, round_data: dict, iterations: int, admin_share: float, seed: int) -> list[tuple[str, float, float, bool]]:
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(iterations):
+        kind = "admin" if rng.random() < admin_share else "participant"
+        flow = _admin_flow if kind == "admin" else _participant_flow
+        started = time.time()
+        start = time.perf_counter()
+        try:
+            ok = flow(db, round_data, rng)
+        except Exception:
+            ok = False
+        samples.append((kind, started, time.perf_counter() - start, ok))
+    return samples
+
+
+def _app_virtual_user(url: str, key: str, round_data: dict, iterations: int, admin_share: float, seed: int):
+    """Virtueller Nutzer im App-Modus: pro Ablauf eine neue Browser-Sitzung über AppTest."""
+    _configure(url, key)
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(iterations):
+        kind = "admin" if rng.random() < admin_share else "participant"
+        flow = _app_admin_flow if kind == "admin" else _app_participant_flow
+        at = AppTest.from_file(str(APP_PATH), default_timeout=120)
+        started = time.time()
+        start = time.perf_counter()
+        try:
+            ok = flow(at, round_data, rng)
+        except Exception:
+            ok = False
+        samples.append((kind, started, time.perf_counter() - start, ok))
+    return samples
+
+
+def run_scenario(db, round_data: dict, concurrency: int, iterations: int, admin_share: float) -> dict:
+    """Führt `concurrency` virtuelle Nutzer mit je `iterations` Abläufen als Threads aus."""
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [
+            pool.submit(_virtual_user, db, round_data, iterations, admin_share, seed)
+            for seed in range(concurrency)
+        ]
+        samples = [sample for future in futures for sample in future.result()]
+    return _scenario_stats(round_data, concurrency, samples)
+
+
+def run_app_scenario(url: str, key: str, round_data: dict, concurrency: int, iterations: int, admin_share: float) -> dict:
+    """Wie `run_scenario`, aber jeder virtuelle Nutzer bedient das echte Skript in einem eigenen Prozess."""
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=concurrency, mp_context=context) as pool:
+        futures = [
+            pool.submit(_app_virtual_user, url, key, round_data, iterations, admin_share, seed)
+            for seed in range(concurrency)
+        ]
+        samples = [sample for future in futures for sample in future.result()]
+    return _scenario_stats(round_data, concurrency, samples)
+
+
+def _scenario_stats(round_data: dict, concurrency: int, samples: list[tuple[str, float, float, bool]]) -> dict:
+    # Wanduhr vom ersten Start bis zum letzten Ende; der Prozessstart zählt nicht mit.
+    elapsed = max(started + duration for _, started, duration, _ in samples) - min(s[1] for s in samples)
+    stats = {
+        "round_size": len(round_data["assignments"]),
+        "concurrency": concurrency,
+        "total": len(samples),
+        "elapsed": elapsed,
+        "throughput": len(samples) / elapsed if elapsed else float("inf"),
+    }
+    for kind in ("participant", "admin"):
+        latencies = sorted(duration for k, _, duration, _ in samples if k == kind)
+        errors = sum(1 for k, _, _, ok in samples if k == kind and not ok)
+        stats[kind] = {
+            "count": len(latencies),
+            "error_rate": errors / len(latencies) if latencies else 0.0,
+            "p50": _percentile(latencies, 50),
+            "p90": _percentile(latencies, 90),
+            "p99": _percentile(latencies, 99),
+            "max": latencies[-1] if latencies else float("nan"),
+        }
+    return stats
+
+
+def format_report(results: list[dict]) -> str:
+    header = (
+        f"{'Runde':>7} {'Parallel':>8} {'Abläufe':>8} {'Abl./s':>9} | "
+        f"{'Art':<11} {'n':>6} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'Fehler':>7}"
+    )
+    lines = [header, "-" * len(header)]
+    for stats in results:
+        prefix = (
+            f"{stats['round_size']:>7} {stats['concurrency']:>8} {stats['total']:>8} "
+            f"{stats['throughput']:>9.1f} | "
+        )
+        for kind in ("participant", "admin"):
+            kind_stats = stats[kind]
+            if not kind_stats["count"]:
+                continue
+            lines.append(
+                prefix
+                + f"{kind:<11} {kind_stats['count']:>6} "
+                + " ".join(f"{kind_stats[p] * 1000:>8.1f}" for p in ("p50", "p90", "p99", "max"))
+                + f" {kind_stats['error_rate']:>6.1%}"
+            )
+            prefix = " " * len(prefix.rstrip("| ")) + " | "
+    return "\n".join(lines)
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lasttest für den Wichtel-Teilnehmer- und Admin-Ablauf.")
+    parser.add_argument("--url", help="Supabase-URL; ohne Angabe wird ein lokaler Fake-Server als eigener Prozess gestartet")
+    parser.add_argument("--key", default="loadtest-key", help="Service-Role-Key für --url")
+    parser.add_argument("--round-sizes", type=_int_list, default=[10, 100, 1000])
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 8, 32])
+    parser.add_argument("--iterations", type=int, default=20, help="Abläufe pro virtuellem Nutzer")
+    parser.add_argument("--admin-share", type=float, default=0.1, help="Anteil der Admin-Abläufe (0-1)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--seeded", action="store_true", help="Runden im deterministischen Seed-Modus speichern")
+    parser.add_argument(
+        "--mode",
+        choices=["storage", "app"],
+        default="storage",
+        help="storage: nur Speicher-/Suchpfad; app: echtes Skript über AppTest (ohne Websocket-Server)",
+    )
+    args = parser.parse_args(argv)
+
+    server = None
+    url = args.url
+    if not url:
+        server, url = start_fake_server()
+
+    try:
+        db = _import_database(url, args.key)
+        rng = random.Random(args.seed)
+        results = []
+        for size in args.round_sizes:
+            round_data = seed_round(db, size, rng, seeded=args.seeded)
+            for concurrency in args.concurrency:
+                if args.mode == "app":
+                    stats = run_app_scenario(url, args.key, round_data, concurrency, args.iterations, args.admin_share)
+                else:
+                    stats = run_scenario(db, round_data, concurrency, args.iterations, args.admin_share)
+                results.append(stats)
+        print(f"Modus: {args.mode}")
+        print(format_report(results))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -1,345 +1,40 @@
-import logging
-import os
-import random
-import json
-import hashlib
-from datetime import datetime, timezone
-
-import requests
 import streamlit as st
 
-st.set_page_config(page_title="Wichtel-Zuteiler", page_icon="🎁", layout="wide")
-
-# Datenbank-Konfiguration
-logger = logging.getLogger(__name__)
-
-SCHEMA_SQL_PATH = "supabase/schema.sql"
-_schema_hint_logged = False
-_supabase_sql_rpc_available = True
-
-def _resolve_supabase_settings():
-    schema = os.getenv("SUPABASE_SCHEMA", "public")
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY")
-
-    try:
-        supabase_secrets = st.secrets.get("connections", {}).get("supabase", {})
-        url = supabase_secrets.get("url", url)
-        key = supabase_secrets.get("key", key)
-        schema = supabase_secrets.get("schema", schema)
-    except Exception:  # pragma: no cover - st.secrets may not be available in tests
-        pass
-
-    if not url or not key:
-        raise RuntimeError(
-            "Supabase credentials missing. Please configure SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY or st.secrets."
-        )
+from assignment import (
+    SEED_ALGORITHM,
+    SeedKeyError,
+    derive_code,
+    generate_assignment,
+    generate_code,
+    generate_seeded_assignment,
+    generate_session_code,
+    generate_user_password,
+    new_seed,
+    parse_constraints,
+)
+from database import (
+    SEED_SEAL_KEY,
+    SessionExpiredError,
+    init_database,
+    load_session_from_admin_code,
+    load_session_from_db,
+    lookup_receiver,
+    save_seeded_session_to_db,
+    save_session_to_db,
+    session_assignments,
+    session_participants,
+    session_seed,
+)
 
-    return url, key, schema
-
-
-SUPABASE_URL, SUPABASE_KEY, SUPABASE_SCHEMA = _resolve_supabase_settings()
-def _supabase_base_url() -> str:
-    return SUPABASE_URL.rstrip("/")
-
-
-def _supabase_table_endpoint(table: str) -> str:
-    return f"{_supabase_base_url()}/rest/v1/{table}"
-
-
-def _supabase_sql_endpoint() -> str:
-    return f"{_supabase_base_url()}/rest/v1/rpc/sql"
-
-
-def _supabase_headers(*, write: bool = False, prefer: list[str] | None = None, include_count: bool = False) -> dict[str, str]:
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-    }
-    schema = SUPABASE_SCHEMA or "public"
-    if schema != "public":
-        profile_header = "Content-Profile" if write else "Accept-Profile"
-        headers[profile_header] = schema
-
-    prefer_clauses: list[str] = []
-    if prefer:
-        prefer_clauses.extend(prefer)
-    if include_count:
-        prefer_clauses.append("count=exact")
-    if prefer_clauses:
-        headers["Prefer"] = ",".join(dict.fromkeys(filter(None, prefer_clauses)))
-    return headers
-
-
-def _supabase_execute_sql(query: str) -> None:
-    headers = _supabase_headers(write=True)
-    headers["Content-Type"] = "application/json"
-    response = requests.post(_supabase_sql_endpoint(), headers=headers, json={"query": query}, timeout=60)
-    if response.status_code != 200:
-        raise RuntimeError(f"Supabase SQL error: {response.status_code} {response.text}")
-
-
-def _ensure_supabase_schema() -> None:
-    global _schema_hint_logged, _supabase_sql_rpc_available
-    if not _supabase_sql_rpc_available:
-        return
-    schema = SUPABASE_SCHEMA or "public"
-    table = f"{schema}.sessions"
-    ddl = f"""
-    CREATE TABLE IF NOT EXISTS {table} (
-        id BIGSERIAL PRIMARY KEY,
-        user_password TEXT NOT NULL,
-        user_password_hash TEXT NOT NULL UNIQUE,
-        admin_code_hash TEXT UNIQUE,
-        assignments_json TEXT NOT NULL,
-        pairs_json TEXT,
-        created_at TIMESTAMPTZ NOT NULL
-    );
-    CREATE UNIQUE INDEX IF NOT EXISTS idx_sessions_admin_code_hash ON {table}(admin_code_hash);
-    """
-    try:
-        _supabase_execute_sql(ddl)
-        _schema_hint_logged = False
-    except Exception as exc:  # pragma: no cover - network dependent
-        message = str(exc)
-        if "public.sql" in message or "PGRST202" in message:
-            _supabase_sql_rpc_available = False
-            if not _schema_hint_logged:
-                logger.info(
-                    "Supabase SQL RPC endpoint is not available (function public.sql missing). "
-                    "Manual setup is required; skipping further automatic attempts."
-                )
-                logger.info(
-                    "Execute the statements from `%s` once in the Supabase SQL editor or CLI.",
-                    SCHEMA_SQL_PATH,
-                )
-                _schema_hint_logged = True
-        else:
-            if not _schema_hint_logged:
-                logger.warning("Could not ensure Supabase schema automatically: %s", exc)
-                logger.warning(
-                    "Please execute the SQL statements from `%s` once in the Supabase SQL editor or via the CLI.",
-                    SCHEMA_SQL_PATH,
-                )
-                _schema_hint_logged = True
-
-
-def _supabase_upsert_session(payload: dict[str, str | None]) -> None:
-    headers = _supabase_headers(
-        write=True,
-        prefer=["resolution=merge-duplicates", "return=minimal"],
-    )
-    headers["Content-Type"] = "application/json"
-    params = {"on_conflict": "user_password_hash"}
-    response = requests.post(
-        _supabase_table_endpoint("sessions"),
-        headers=headers,
-        params=params,
-        json=[payload],
-        timeout=60,
-    )
-    if response.status_code == 404:
-        _ensure_supabase_schema()
-        response = requests.post(
-            _supabase_table_endpoint("sessions"),
-            headers=headers,
-            params=params,
-            json=[payload],
-            timeout=60,
-        )
-    if response.status_code == 404:
-        raise RuntimeError(
-            "Supabase table 'sessions' is missing. Please run the SQL from "
-            f"`{SCHEMA_SQL_PATH}` on your Supabase project to create it."
-        )
-    if response.status_code not in (200, 201, 204):
-        raise RuntimeError(f"Supabase upsert failed: {response.status_code} {response.text}")
-
-
-def _supabase_fetch_single(field: str, value: str) -> dict[str, str] | None:
-    params = {
-        "select": "id,user_password,assignments_json,pairs_json,created_at",  # minimal columns
-        field: f"eq.{value}",
-        "limit": "1",
-    }
-    response = requests.get(
-        _supabase_table_endpoint("sessions"),
-        headers=_supabase_headers(include_count=False),
-        params=params,
-        timeout=60,
-    )
-    if response.status_code == 404:
-        # Supabase can take a moment to realise a freshly created table exists.
-        _ensure_supabase_schema()
-        return None
-        return None
-    if response.status_code not in (200, 206):
-        raise RuntimeError(f"Supabase query failed: {response.status_code} {response.text}")
-    records = response.json()
-    if not records:
-        return None
-    return records[0]
-def init_database() -> None:
-    """Initialisiert die Supabase-Datenbank und legt Tabellen an."""
-    _ensure_supabase_schema()
-
-
-def hash_user_password(password: str) -> str:
-    return hashlib.sha256(password.encode("utf-8")).hexdigest()
-
-
-def hash_admin_code(code: str) -> str:
-    return hashlib.sha256(code.encode("utf-8")).hexdigest()
-
-
-def save_session_to_db(user_password: str, admin_code: str, assignments: list, pairs: list) -> None:
-    assignments_json = json.dumps(assignments, ensure_ascii=False)
-    pairs_json = json.dumps(pairs, ensure_ascii=False)
-    user_hash = hash_user_password(user_password)
-    admin_hash = hash_admin_code(admin_code)
-    timestamp = datetime.utcnow().replace(tzinfo=timezone.utc).isoformat()
-
-    payload = {
-        "user_password": user_password,
-        "user_password_hash": user_hash,
-        "admin_code_hash": admin_hash,
-        "assignments_json": assignments_json,
-        "pairs_json": pairs_json,
-        "created_at": timestamp,
-    }
-    _supabase_upsert_session(payload)
-
-
-def load_session_from_db(user_password: str):
-    hashed = hash_user_password(user_password)
-    record = _supabase_fetch_single("user_password_hash", hashed)
-    if not record:
-        return None
-
-    return {
-        "id": record.get("id"),
-        "user_password": record.get("user_password"),
-        "assignments": json.loads(record["assignments_json"]),
-        "pairs": json.loads(record["pairs_json"]) if record.get("pairs_json") else [],
-    }
-
-
-def load_session_from_admin_code(admin_code: str):
-    hashed = hash_admin_code(admin_code)
-    record = _supabase_fetch_single("admin_code_hash", hashed)
-    if not record:
-        return None
-
-    return {
-        "id": record.get("id"),
-        "user_password": record.get("user_password"),
-        "assignments": json.loads(record["assignments_json"]),
-        "pairs": json.loads(record["pairs_json"]) if record.get("pairs_json") else [],
-        "created_at": record.get("created_at"),
-    }
+st.set_page_config(page_title="Wichtel-Zuteiler", page_icon="🎁", layout="wide")
 
+SEED_KEY_ERROR = (
+    "🔐 Diese Runde wurde deterministisch gespeichert und kann nicht entschlüsselt werden "
+    "(Seed-Schlüssel fehlt oder wurde geändert). Bitte wende dich an den Organisator."
+)
 
 init_database()
 
-# Hilfsfunktionen
-def generate_code(length=6):
-    """Generiert einen zufälligen Code"""
-    chars = 'ABCDEFGHJKMNPQRSTUVWXYZ23456789'
-    return ''.join(random.choice(chars) for _ in range(length))
-
-def generate_user_password(length=8):
-    """Generiert ein lesbares Passwort für User"""
-    words = ['Stern', 'Baum', 'Schnee', 'Mond', 'Licht', 'Engel', 'Kerze', 'Glocke', 
-             'Frost', 'Wind', 'Nebel', 'Sonne', 'Regen', 'Wolke', 'Blitz', 'Feuer']
-    nums = ''.join([str(random.randint(0, 9)) for _ in range(3)])
-    return f"{random.choice(words)}{nums}"
-
-def generate_session_code(length=12):
-    """Generiert einen einmaligen Session-Admin-Code."""
-    chars = 'ABCDEFGHJKMNPQRSTUVWXYZ23456789'
-    return ''.join(random.choice(chars) for _ in range(length))
-
-def parse_pairs(pairs_text, names):
-    """Parst Paare aus dem Textfeld"""
-    pairs = []
-    if not pairs_text:
-        return pairs
-    
-    lines = [l.strip() for l in pairs_text.split('\n') if l.strip()]
-    name_lower = {n.lower(): n for n in names}
-    
-    for line in lines:
-        parts = [p.strip() for p in line.split(',') if p.strip()]
-        if len(parts) >= 2:
-            a_lower = parts[0].lower()
-            b_lower = parts[1].lower()
-            if a_lower in name_lower and b_lower in name_lower:
-                pairs.append((name_lower[a_lower], name_lower[b_lower]))
-    
-    return pairs
-
-def generate_assignment(names, pairs, allow_self=False, max_attempts=5000):
-    """Generiert eine Wichtel-Zuteilung mit Paare-Schutz (verhindert, dass jemand seinem Partner zugewiesen wird)."""
-    if len(names) == 0:
-        return None
-    if len(names) == 1 and allow_self:
-        return [(names[0], names[0])]
-    if len(names) == 1:
-        return None
-
-    # Erstelle Paare-Map (lowercase für sichere Vergleiche)
-    pair_map = {}
-    for a, b in pairs:
-        pair_map[a.lower()] = b.lower()
-        pair_map[b.lower()] = a.lower()
-
-    n = len(names)
-    indices = list(range(n))
-
-    # Lowercase-Namen für Vergleiche
-    names_lower = [n_.lower() for n_ in names]
-
-    for attempt in range(max_attempts):
-        perm = indices.copy()
-        random.shuffle(perm)
-
-        valid = True
-        for i in range(n):
-            giver_idx = i
-            receiver_idx = perm[i]
-
-            # Regel 1: Keine Selbstzuweisung (außer erlaubt)
-            if not allow_self and giver_idx == receiver_idx:
-                valid = False
-                break
-
-            giver = names_lower[giver_idx]
-            receiver = names_lower[receiver_idx]
-
-            # Regel 2: Verhindere, dass jemand seinem definierten Partner zugewiesen wird
-            partner = pair_map.get(giver)
-            if partner and partner == receiver:
-                valid = False
-                break
-
-        if valid:
-            return [(names[i], names[perm[i]]) for i in range(n)]
-
-    # Fallback: Rotation — aber nur wenn sie nicht gegen Paare verstößt
-    if not allow_self and n > 1:
-        rotation = [(names[i], names[(i + 1) % n]) for i in range(n)]
-        # Prüfe Rotation auf Paar-Konflikte
-        conflict = False
-        for giver, receiver in rotation:
-            if pair_map.get(giver.lower()) == receiver.lower():
-                conflict = True
-                break
-        if not conflict:
-            return rotation
-
-    return None
-
-
 # Initialisiere Session State
 if 'temp_assignments' not in st.session_state:
     st.session_state.temp_assignments = None
@@ -347,6 +42,8 @@ if 'temp_codes' not in st.session_state:
     st.session_state.temp_codes = {}
 if 'temp_pairs' not in st.session_state:
     st.session_state.temp_pairs = []
+if 'temp_exclusions' not in st.session_state:
+    st.session_state.temp_exclusions = {}
 if 'current_user_password' not in st.session_state:
     st.session_state.current_user_password = None
 if 'loaded_data' not in st.session_state:
@@ -359,6 +56,62 @@ if 'admin_session_code' not in st.session_state:
     st.session_state.admin_session_code = None
 if 'revealed_assignments' not in st.session_state:
     st.session_state.revealed_assignments = set()
+if 'temp_seed' not in st.session_state:
+    st.session_state.temp_seed = None
+if 'temp_allow_self' not in st.session_state:
+    st.session_state.temp_allow_self = False
+if 'temp_algo' not in st.session_state:
+    st.session_state.temp_algo = SEED_ALGORITHM
+
+# Fragmente: Klicks darin laufen nur die jeweilige Funktion neu statt das ganze Skript
+# (Zugangsdaten, Session-State, Sidebar, Admin-Formulare, Download-Text).
+@st.fragment
+def participant_lookup():
+    """Name/Code-Eingabe und Empfängeranzeige im Teilnehmer-Modus."""
+    st.subheader("🎁 Finde heraus, wen du beschenkst!")
+
+    name = st.text_input("Dein Name:", placeholder="z.B. Anna", key="user_name")
+    code = st.text_input("Dein persönlicher Code:", placeholder="z.B. A1B2C3", key="user_code").upper()
+
+    if st.button("🎅 Empfänger anzeigen", type="primary", use_container_width=True):
+        if not name or not code:
+            st.error("❌ Bitte fülle beide Felder aus!")
+        else:
+            try:
+                receiver_name = lookup_receiver(st.session_state.loaded_data, name, code)
+            except SeedKeyError:
+                st.error(SEED_KEY_ERROR)
+                return
+
+            if receiver_name:
+                st.balloons()
+                st.success("🎄 **Du beschenkst:**")
+                st.markdown(f"# 🎁 **{receiver_name}**")
+                st.info("🤫 Halte das geheim und viel Spaß beim Wichteln!")
+            else:
+                st.error("❌ Name oder Code nicht gefunden. Bitte überprüfe deine Eingaben!")
+                st.caption("💡 Tipp: Achte auf Groß-/Kleinschreibung beim Code!")
+
+
+@st.fragment
+def assignment_row(giver, code, receiver, reveal_key):
+    """Eine Zeile der Admin-Teilnehmerübersicht; ein Reveal rendert nur diese Zeile neu."""
+    col1, col2, col3 = st.columns([2, 2, 2])
+    with col1:
+        st.markdown(f"**{giver}**")
+    with col2:
+        st.code(code, language=None)
+    with col3:
+        slot = st.empty()
+        revealed = reveal_key in st.session_state.revealed_assignments
+        if not revealed and slot.button("Empfänger anzeigen", key=f"reveal_{reveal_key}", use_container_width=True):
+            revealed_set = set(st.session_state.revealed_assignments)
+            revealed_set.add(reveal_key)
+            st.session_state.revealed_assignments = revealed_set
+            revealed = True
+        if revealed:
+            slot.success(f"🎁 {receiver}")
+
 
 # Header
 st.title("🎁 Wichtel-Zuteiler")
@@ -389,10 +142,17 @@ if mode == "👤 Teilnehmer":
             unlock_btn = st.button("🔓 Laden", type="primary", use_container_width=True)
         
         if unlock_btn and user_pw:
+            expired = False
             with st.spinner("Lade Daten..."):
-                loaded_data = load_session_from_db(user_pw)
-
-            if loaded_data:
+                try:
+                    loaded_data = load_session_from_db(user_pw)
+                except SessionExpiredError:
+                    loaded_data = None
+                    expired = True
+
+            if expired:
+                st.error("⌛ Diese Wichtel-Runde ist abgelaufen und steht nicht mehr zur Verfügung.")
+            elif loaded_data:
                 st.session_state.current_user_password = user_pw
                 st.session_state.loaded_data = loaded_data
                 st.success("✅ Wichtel-Runde geladen!")
@@ -418,33 +178,7 @@ if mode == "👤 Teilnehmer":
         col1, col2 = st.columns([2, 1])
         
         with col1:
-            st.subheader("🎁 Finde heraus, wen du beschenkst!")
-            
-            name = st.text_input("Dein Name:", placeholder="z.B. Anna", key="user_name")
-            code = st.text_input("Dein persönlicher Code:", placeholder="z.B. A1B2C3", key="user_code").upper()
-            
-            if st.button("🎅 Empfänger anzeigen", type="primary", use_container_width=True):
-                if not name or not code:
-                    st.error("❌ Bitte fülle beide Felder aus!")
-                else:
-                    # Suche nach Übereinstimmung
-                    found = False
-                    receiver_name = None
-                    
-                    for item in st.session_state.loaded_data['assignments']:
-                        if item['name'].upper() == name.upper() and item['code'] == code:
-                            found = True
-                            receiver_name = item['receiver']
-                            break
-                    
-                    if found and receiver_name:
-                        st.balloons()
-                        st.success("🎄 **Du beschenkst:**")
-                        st.markdown(f"# 🎁 **{receiver_name}**")
-                        st.info("🤫 Halte das geheim und viel Spaß beim Wichteln!")
-                    else:
-                        st.error("❌ Name oder Code nicht gefunden. Bitte überprüfe deine Eingaben!")
-                        st.caption("💡 Tipp: Achte auf Groß-/Kleinschreibung beim Code!")
+            participant_lookup()
         
         with col2:
             st.subheader("ℹ️ Anleitung")
@@ -460,7 +194,7 @@ if mode == "👤 Teilnehmer":
             
             # Info über geladene Runde
             if st.session_state.loaded_data:
-                participant_count = len(st.session_state.loaded_data['assignments'])
+                participant_count = len(session_participants(st.session_state.loaded_data))
                 st.info(f"👥 {participant_count} Teilnehmer in dieser Runde")
 
 # SESSION-ADMIN-MODUS
@@ -482,19 +216,29 @@ else:
             help="Gib alle Teilnehmer ein, einen Namen pro Zeile"
         )
 
-        st.subheader("2. Paare definieren (optional)")
+        st.subheader("2. Paare & Gruppen definieren (optional)")
         pairs_input = st.text_area(
-            "Paare, die sich NICHT gegenseitig beschenken dürfen:",
+            "Paare oder Gruppen, die sich NICHT gegenseitig beschenken dürfen:",
             height=100,
-            placeholder="Anna,Ben\nCarla,Daniel",
-            help="Trage hier Paare ein (z.B. Ehepaar, Geschwister). Format: Name1,Name2"
+            placeholder="Anna,Ben\nFamilie Müller: Carla,Daniel,Eva\nFrank: Anna",
+            help="Eine Gruppe pro Zeile (z.B. Ehepaar, Haushalt, Team). Format: Name1,Name2,... "
+                 "Mit 'Name: Name1,Name2' beschenkt Name die genannten Personen nicht; ist Name "
+                 "kein Teilnehmer, gilt er als Beschriftung und die Zeile als Gruppe."
         )
 
-        st.info("ℹ️ **Wichtig:** Paare werden niemals gegenseitig zugeordnet (A ↔ B wird verhindert).")
+        st.info("ℹ️ **Wichtig:** Mitglieder einer Gruppe werden niemals einander zugeordnet (A ↔ B wird verhindert).")
 
     with col2:
         st.subheader("Optionen")
         allow_self = st.checkbox("Selbstzuweisung erlauben", value=False)
+        seeded = st.checkbox(
+            "Deterministisch speichern (Seed)",
+            value=False,
+            disabled=not SEED_SEAL_KEY,
+            help="Speichert nur Teilnehmer, Paare und einen geheimen Seed. Zuteilung und Codes "
+                 "werden beim Laden daraus berechnet und sind für Prüfungen reproduzierbar."
+                 + ("" if SEED_SEAL_KEY else " Erfordert einen eigenen `WICHTEL_SEED_KEY`."),
+        )
 
         if st.button("🎲 Zuteilung generieren", type="primary", use_container_width=True):
             names = [n.strip() for n in names_input.split('\n') if n.strip()]
@@ -503,19 +247,33 @@ else:
             if len(names) < 2 and not allow_self:
                 st.error("❌ Mindestens 2 Namen erforderlich!")
             else:
-                pairs = parse_pairs(pairs_input, names)
+                parse_warnings = []
+                pairs, exclusions = parse_constraints(pairs_input, names, parse_warnings)
+                for warning in parse_warnings:
+                    st.warning(f"⚠️ {warning}")
 
+                seed = new_seed() if seeded else None
                 with st.spinner("Generiere Zuteilung..."):
-                    result = generate_assignment(names, pairs, allow_self)
+                    if seed:
+                        result = generate_seeded_assignment(seed, names, pairs, allow_self, exclusions)
+                    else:
+                        result = generate_assignment(names, pairs, allow_self, exclusions=exclusions)
 
                 if result is None:
                     st.error("❌ Konnte keine gültige Zuteilung finden. Versuche es erneut!")
                 else:
-                    codes = {giver: generate_code() for giver, _ in result}
+                    if seed:
+                        codes = {giver: derive_code(seed, giver) for giver, _ in result}
+                    else:
+                        codes = {giver: generate_code() for giver, _ in result}
 
                     st.session_state.temp_assignments = result
                     st.session_state.temp_codes = codes
                     st.session_state.temp_pairs = pairs
+                    st.session_state.temp_exclusions = exclusions
+                    st.session_state.temp_seed = seed
+                    st.session_state.temp_algo = SEED_ALGORITHM
+                    st.session_state.temp_allow_self = allow_self
                     if st.session_state.temp_session_admin_code is None:
                         st.session_state.temp_session_admin_code = generate_session_code()
                     st.session_state.revealed_assignments = set()
@@ -524,11 +282,25 @@ else:
         if st.session_state.temp_assignments:
             if st.button("🔄 Neu würfeln", use_container_width=True):
                 names = [giver for giver, _ in st.session_state.temp_assignments]
-                result = generate_assignment(names, st.session_state.temp_pairs, allow_self)
+                seed = new_seed() if seeded else None
+                if seed:
+                    result = generate_seeded_assignment(
+                        seed, names, st.session_state.temp_pairs, allow_self, st.session_state.temp_exclusions
+                    )
+                else:
+                    result = generate_assignment(
+                        names, st.session_state.temp_pairs, allow_self, exclusions=st.session_state.temp_exclusions
+                    )
                 if result:
-                    codes = {giver: generate_code() for giver, _ in result}
+                    if seed:
+                        codes = {giver: derive_code(seed, giver) for giver, _ in result}
+                    else:
+                        codes = {giver: generate_code() for giver, _ in result}
                     st.session_state.temp_assignments = result
                     st.session_state.temp_codes = codes
+                    st.session_state.temp_seed = seed
+                    st.session_state.temp_algo = SEED_ALGORITHM
+                    st.session_state.temp_allow_self = allow_self
                     st.success("✅ Neue Zuteilung erstellt!")
                 else:
                     st.error("❌ Konnte keine neue Zuteilung finden!")
@@ -557,9 +329,15 @@ else:
             txt_content += "="*50 + "\n\n"
 
             if st.session_state.temp_pairs:
-                txt_content += "Definierte Paare:\n"
-                for a, b in st.session_state.temp_pairs:
-                    txt_content += f"  {a} & {b}\n"
+                txt_content += "Definierte Paare/Gruppen:\n"
+                for group in st.session_state.temp_pairs:
+                    txt_content += f"  {' & '.join(group)}\n"
+                txt_content += "\n"
+
+            if st.session_state.temp_exclusions:
+                txt_content += "Persönliche Ausschlüsse:\n"
+                for giver, targets in st.session_state.temp_exclusions.items():
+                    txt_content += f"  {giver} beschenkt nicht: {', '.join(targets)}\n"
                 txt_content += "\n"
 
             txt_content += "CODES FÜR TEILNEHMER:\n"
@@ -595,16 +373,30 @@ else:
                         }
                         for giver, receiver in st.session_state.temp_assignments
                     ],
-                    "pairs": [[a, b] for a, b in st.session_state.temp_pairs]
+                    "pairs": [list(group) for group in st.session_state.temp_pairs],
+                    "exclusions": st.session_state.temp_exclusions,
                 }
 
                 try:
-                    save_session_to_db(
-                        data_to_save["user_password"],
-                        data_to_save["admin_code"],
-                        data_to_save["assignments"],
-                        data_to_save["pairs"],
-                    )
+                    if st.session_state.temp_seed:
+                        save_seeded_session_to_db(
+                            data_to_save["user_password"],
+                            data_to_save["admin_code"],
+                            [item["name"] for item in data_to_save["assignments"]],
+                            data_to_save["pairs"],
+                            st.session_state.temp_seed,
+                            st.session_state.temp_allow_self,
+                            data_to_save["exclusions"],
+                            st.session_state.temp_algo,
+                        )
+                    else:
+                        save_session_to_db(
+                            data_to_save["user_password"],
+                            data_to_save["admin_code"],
+                            data_to_save["assignments"],
+                            data_to_save["pairs"],
+                            data_to_save["exclusions"],
+                        )
                 except Exception as e:
                     st.error(f"❌ Speichern fehlgeschlagen: {e}")
                 else:
@@ -620,6 +412,9 @@ else:
                     st.session_state.temp_assignments = None
                     st.session_state.temp_codes = {}
                     st.session_state.temp_pairs = []
+                    st.session_state.temp_exclusions = {}
+                    st.session_state.temp_seed = None
+                    st.session_state.temp_algo = SEED_ALGORITHM
                     if 'temp_user_password' in st.session_state:
                         del st.session_state.temp_user_password
                     if 'temp_session_admin_code' in st.session_state:
@@ -641,9 +436,16 @@ else:
             if not admin_code_input:
                 st.error("Bitte gib einen Session-Admin-Code ein.")
             else:
+                expired = False
                 with st.spinner("Lade Session..."):
-                    admin_data = load_session_from_admin_code(admin_code_input)
-                if admin_data:
+                    try:
+                        admin_data = load_session_from_admin_code(admin_code_input)
+                    except SessionExpiredError:
+                        admin_data = None
+                        expired = True
+                if expired:
+                    st.error("⌛ Diese Session ist abgelaufen und wurde bzw. wird archiviert.")
+                elif admin_data:
                     st.session_state.admin_session_code = admin_code_input
                     st.session_state.admin_session_data = admin_data
                     st.session_state.revealed_assignments = set()
@@ -658,9 +460,17 @@ else:
             st.session_state.revealed_assignments = set()
             st.rerun()
 
+    admin_assignments = None
     if st.session_state.admin_session_data:
+        try:
+            admin_assignments = session_assignments(st.session_state.admin_session_data)
+        except SeedKeyError:
+            st.error(SEED_KEY_ERROR)
+
+    if admin_assignments is not None:
         data = st.session_state.admin_session_data
-        participant_count = len(data["assignments"])
+        assignments = admin_assignments
+        participant_count = len(assignments)
 
         st.success(
             f"Aktive Session geöffnet. User-Passwort: `{data['user_password']}`, Teilnehmer: {participant_count}"
@@ -668,42 +478,33 @@ else:
         st.caption(f"Erstellt am: {data['created_at'][:19]} UTC")
 
         if data["pairs"]:
-            st.markdown("**Definierte Paare:** " + ", ".join(f"{a} & {b}" for a, b in data["pairs"]))
+            st.markdown("**Definierte Paare/Gruppen:** " + ", ".join(" & ".join(group) for group in data["pairs"]))
+        if data.get("exclusions"):
+            st.markdown(
+                "**Persönliche Ausschlüsse:** "
+                + "; ".join(f"{giver} ↛ {', '.join(targets)}" for giver, targets in data["exclusions"].items())
+            )
 
         st.subheader("🎁 Teilnehmerübersicht")
         session_id = data["id"]
 
-        for item in data["assignments"]:
-            giver = item["name"]
-            code = item["code"]
-            receiver = item["receiver"]
-            reveal_key = f"{session_id}:{code}"
-            revealed = reveal_key in st.session_state.revealed_assignments
-
-            col1, col2, col3 = st.columns([2, 2, 2])
-            with col1:
-                st.markdown(f"**{giver}**")
-            with col2:
-                st.code(code, language=None)
-            with col3:
-                if revealed:
-                    st.success(f"🎁 {receiver}")
-                else:
-                    if st.button("Empfänger anzeigen", key=f"reveal_{reveal_key}", use_container_width=True):
-                        revealed_set = set(st.session_state.revealed_assignments)
-                        revealed_set.add(reveal_key)
-                        st.session_state.revealed_assignments = revealed_set
-                        st.rerun()
+        for item in assignments:
+            assignment_row(item["name"], item["code"], item["receiver"], f"{session_id}:{item['code']}")
 
         st.divider()
         if st.button("🔁 Session in Formular laden", key="load_session_into_form"):
             st.session_state.temp_assignments = [
-                (item["name"], item["receiver"]) for item in data["assignments"]
+                (item["name"], item["receiver"]) for item in assignments
             ]
             st.session_state.temp_codes = {
-                item["name"]: item["code"] for item in data["assignments"]
+                item["name"]: item["code"] for item in assignments
             }
             st.session_state.temp_pairs = [tuple(pair) for pair in data.get("pairs", [])]
+            st.session_state.temp_exclusions = data.get("exclusions", {})
+            st.session_state.temp_seed = session_seed(data)
+            # Alte Seed-Sessions behalten ihre Solver-Version, bis neu gewürfelt wird.
+            st.session_state.temp_algo = data.get("algo", SEED_ALGORITHM)
+            st.session_state.temp_allow_self = data.get("allow_self", False)
             st.session_state.temp_user_password = data["user_password"]
             st.session_state.temp_session_admin_code = st.session_state.admin_session_code
             st.success("Session ins Formular übernommen. Du kannst nun Änderungen vornehmen und neu speichern.")